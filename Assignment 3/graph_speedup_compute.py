@@ -4,9 +4,9 @@ import argparse # See https://docs.python.org/3/library/argparse.html
 import random
 from math import pi
 import time
-import matplotlib.pyplot as plt
 
 def print_speedup(args):
+    import matplotlib.pyplot as plt
 
     fig, ax = plt.subplots()
     theory_list_x = [1, 2, 4, 8, 16, 32]
@@ -7,11 +7,11 @@
 import logging
 import argparse
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.datasets import make_blobs
 import time
 
 def generateData(n, c):
+    # Imported here, scikit-learn takes long to import and is only needed for the input
+    from sklearn.datasets import make_blobs
     logging.info(f"Generating {n} samples in {c} classes")
     X, y = make_blobs(n_samples=n, centers = c, cluster_std=1.7, shuffle=False,
                       random_state = 2122)
@@ -103,6 +103,7 @@ def computeClustering(args):
     print("Total time: %1.5f" % (end_time - start_time))
 
     if args.plot: # Assuming 2D data
+        import matplotlib.pyplot as plt
         fig, axes = plt.subplots(nrows=1, ncols=1)
         axes.scatter(X[:, 0], X[:, 1], c=assignment, alpha=0.2)
         plt.title("k-means result")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#
+# Worker functions of problem2d.py. They live in their own module that only
+# imports NumPy, so processes started with spawn or forkserver can import
+# them without loading matplotlib or scikit-learn first.
+#
+import numpy as np
+
+def nearestCentroid(datum, centroids):
+    # norm(a-b) is Euclidean distance, matrix - vector computes difference
+    # for all rows of matrix
+    dist = np.linalg.norm(centroids - datum, axis=1)
+    return np.argmin(dist), np.min(dist)
+
+# Function to assign data points to centroids.
+# Used by the worker function that in turn can be parallelized.
+# With weights every point counts as that many points, cluster sizes are then sums of weights.
+def assignDataPoints(centroids, data, k, weights = None):
+    N = len(data)
+    # The cluster index: c[i] = j indicates that i-th datum is in j-th cluster
+    c = np.zeros(N, dtype=int)
+
+    # Assign data points to nearest centroid
+    variation = np.zeros(k)
+    if weights is None:
+        cluster_sizes = np.zeros(k, dtype=int)
+    else:
+        cluster_sizes = np.zeros(k)
+    for i in range(N):
+        cluster, dist = nearestCentroid(data[i],centroids)
+        c[i] = cluster
+        if weights is None:
+            cluster_sizes[cluster] += 1
+            variation[cluster] += dist**2
+        else:
+            cluster_sizes[cluster] += weights[i]
+            variation[cluster] += weights[i] * dist**2
+    return c, variation, cluster_sizes
+
+# Function to recompute centroids.
+# Used by the worker function that in turn can be parallelized.
+def recomputeCentroids(assignments, data, k, weights = None):
+    N = len(data)
+    # Recompute centroids
+    centroids = np.zeros((k,2)) # This fixes the dimension to 2
+    for i in range(N):
+        if weights is None:
+            centroids[assignments[i]] += data[i]
+        else:
+            centroids[assignments[i]] += weights[i] * data[i]
+    return centroids
+
+# Worker function that can be parallelized
+# Exchanges data through queues with the kmeans function
+def worker(job_queue, result_queue, data, k, i, weights = None):
+    while True:
+        centroids = job_queue.get()
+        c, variation, cluster_sizes = assignDataPoints(centroids, data, k, weights)
+        sums = recomputeCentroids(c, data, k, weights)
+        result_queue.put((sums, variation, cluster_sizes, c, i))
+
+
+# Splits one cluster in two with 2-means on its points only.
+# Used by bisectingKmeans, which runs several splits in parallel.
+def splitCluster(task):
+    points, nr_iter, seed = task
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), size=2, replace=False)]
+    for j in range(nr_iter):
+        # Squared distance of every point to both centroids at once
+        dist = ((points[:, np.newaxis, :] - centroids[np.newaxis, :, :])**2).sum(axis=2)
+        c = np.argmin(dist, axis=1)
+        new_centroids = np.array([points[c == i].mean(axis=0) if np.any(c == i) else centroids[i]
+                                  for i in range(2)])
+        if np.allclose(new_centroids, centroids):
+            break
+        centroids = new_centroids
+    dist = ((points[:, np.newaxis, :] - centroids[np.newaxis, :, :])**2).sum(axis=2)
+    c = np.argmin(dist, axis=1)
+    return c
+
+def clusterVariation(points):
+    return float(((points - points.mean(axis=0))**2).sum())
+
+
+# Chunk functions of the coreset construction in problem2d.py
+
+def chunkSum(chunk):
+    return chunk.sum(axis=0)
+
+def chunkDistance(task):
+    chunk, mean = task
+    return ((chunk - mean)**2).sum()
+
+def sampleChunk(task):
+    chunk, mean, N, total_distance, nr_samples, m, seed = task
+    rng = np.random.default_rng(seed)
+    q = 0.5 / N + 0.5 * ((chunk - mean)**2).sum(axis=1) / total_distance
+    picked = rng.choice(len(chunk), size=nr_samples, p=q / q.sum())
+    return chunk[picked], 1.0 / (m * q[picked])
+
+def assignChunk(task):
+    centroids, chunk, k = task
+    c, variation, cluster_sizes = assignDataPoints(centroids, chunk, k)
+    return c, variation.sum()
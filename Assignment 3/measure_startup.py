@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+import argparse
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import time
+
+# Measures how long the scripts in this directory take to start, and how
+# long it takes to get worker processes running when they are the main
+# module. Processes started with spawn or forkserver import the main module
+# again, so everything it imports at the top is paid for in every worker.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = ['kmeans.py', 'problem2d.py', 'problem1b.py', 'mp-pi-montecarlo-pool.py',
+           'mp-pi-montecarlo-pool_speedup_graph.py', 'graph_speedup_compute.py']
+
+
+def startup_time(path):
+    # --help returns right after the imports and the argument parser
+    start = time.time()
+    subprocess.run([sys.executable, path, '--help'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.time() - start
+
+
+def spawn_time(path, method, workers):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--spawn-child', path,
+                             '--method', method, '--workers', str(workers)],
+                            check=True, stdout=subprocess.PIPE).stdout
+    return float(output)
+
+
+def spawn_child(args):
+    # Workers re-import the main module from its file, pretend to be the script
+    sys.modules['__main__'].__file__ = os.path.abspath(args.spawn_child)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.spawn_child)))
+    context = mp.get_context(args.method)
+    start = time.time()
+    with context.Pool(args.workers) as pool:
+        # A builtin is used as the task so nothing from this file has to be imported
+        pool.map(abs, range(args.workers), chunksize=1)
+        elapsed = time.time() - start
+    print(elapsed)
+
+
+def measure(args):
+    print("Script\t\t\t\t\tStartup [s]\tWorkers ready [s]")
+    for name in args.scripts.split(','):
+        path = os.path.join(args.directory, name)
+        startup = min(startup_time(path) for i in range(args.repeat))
+        spawn = min(spawn_time(path, args.method, args.workers) for i in range(args.repeat))
+        print("%-40s%1.3f\t\t%1.3f" % (name, startup, spawn))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Measure the startup time of the scripts and of their worker processes',
+        epilog = 'Example: measure_startup.py --method spawn --workers 8'
+    )
+    parser.add_argument('--scripts',
+                        default=','.join(SCRIPTS),
+                        type = str,
+                        help='Comma separated scripts to measure')
+    parser.add_argument('--directory',
+                        default=HERE,
+                        type = str,
+                        help='Directory with the scripts, for example a checkout of an older version')
+    parser.add_argument('--method', '-m',
+                        default='spawn',
+                        choices=['spawn', 'forkserver', 'fork'],
+                        help='Start method of the worker processes')
+    parser.add_argument('--workers', '-w',
+                        default=4,
+                        type = int,
+                        help='Number of worker processes to start')
+    parser.add_argument('--repeat',
+                        default=3,
+                        type = int,
+                        help='Number of runs, the fastest one is reported')
+    parser.add_argument('--spawn-child',
+                        type = str,
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.spawn_child:
+        spawn_child(args)
+    else:
+        measure(args)
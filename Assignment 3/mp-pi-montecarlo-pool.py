@@ -2,8 +2,15 @@
 import multiprocessing # See https://docs.python.org/3/library/multiprocessing.html
 import argparse # See https://docs.python.org/3/library/argparse.html
 import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from math import pi
 import time
+import numpy as np
+
+# Number of samples drawn per NumPy call in the thread backend.
+# Keeps the temporary arrays at a few MB regardless of the step count.
+CHUNK_SIZE = 1 << 20
 
 def sample_pi(n):
     """ Perform n steps of Monte Carlo simulation for estimating Pi/4.
@@ -19,17 +26,95 @@ def sample_pi(n):
     return s
 
 
+def sample_pi_numpy(n, seed):
+    """ Vectorized version of sample_pi used by the thread backend.
+        NumPy releases the GIL while generating and comparing the samples,
+        so several threads can run this at the same time."""
+    rng = np.random.default_rng(seed)
+    s = 0
+    remaining = n
+    while remaining > 0:
+        b = min(remaining, CHUNK_SIZE)
+        x = rng.random(b)
+        y = rng.random(b)
+        s += int(np.count_nonzero(x*x + y*y <= 1.0))
+        remaining -= b
+    return s
+
+
+def noop(_):
+    return None
+
+
+def gil_enabled():
+    # sys._is_gil_enabled only exists on 3.13+, older interpreters always have the GIL
+    check = getattr(sys, "_is_gil_enabled", None)
+    return True if check is None else check()
+
+
+def run_processes(n, workers):
+    start = time.time()
+    p = multiprocessing.Pool(workers)
+    # Wait until every worker has answered once so startup includes spawning them
+    p.map(noop, range(workers), chunksize=1)
+    startup = time.time() - start
+
+    start = time.time()
+    s = p.map(sample_pi, [n]*workers)
+    sampling = time.time() - start
+    p.close()
+    p.join()
+    return sum(s), startup, sampling
+
+
+def run_threads(n, workers):
+    start = time.time()
+    p = ThreadPoolExecutor(max_workers=workers)
+    list(p.map(noop, range(workers)))
+    startup = time.time() - start
+
+    # Independent streams for every thread, see numpy's SeedSequence docs
+    seeds = np.random.SeedSequence().spawn(workers)
+    start = time.time()
+    s = p.map(sample_pi_numpy, [n]*workers, seeds)
+    s_total = sum(s)
+    sampling = time.time() - start
+    p.shutdown()
+    return s_total, startup, sampling
+
+
+BACKENDS = {
+    "processes": run_processes,
+    "threads": run_threads,
+}
+
+
 def compute_pi(args):
     n = int(args.steps / args.workers)
-    
-    p = multiprocessing.Pool(args.workers)
-    s = p.map(sample_pi, [n]*args.workers)
-
     n_total = n*args.workers
-    s_total = sum(s)
-    pi_est = (4.0*s_total)/n_total
-    print(" Steps\tSuccess\tPi est.\tError")
-    print("%6d\t%7d\t%1.5f\t%1.5f" % (n_total, s_total, pi_est, pi-pi_est))
+
+    if args.backend == "threads" or args.compare:
+        print("Thread backend, GIL enabled: %s" % gil_enabled())
+
+    backends = list(BACKENDS) if args.compare else [args.backend]
+    results = []
+    for backend in backends:
+        s_total, startup, sampling = BACKENDS[backend](n, args.workers)
+        results.append((backend, s_total, startup, sampling))
+
+    # One row per backend, labelled when there is more than one
+    if args.compare:
+        print("Backend\t\t Steps\tSuccess\tPi est.\tError")
+    else:
+        print(" Steps\tSuccess\tPi est.\tError")
+    for backend, s_total, startup, sampling in results:
+        pi_est = (4.0*s_total)/n_total
+        row = "%6d\t%7d\t%1.5f\t%1.5f" % (n_total, s_total, pi_est, pi-pi_est)
+        print("%-9s\t%s" % (backend, row) if args.compare else row)
+
+    print("Backend\t\tStartup [s]\tSampling [s]\tSteps/s")
+    for backend, s_total, startup, sampling in results:
+        print("%-9s\t%1.6f\t%1.6f\t%1.0f" % (backend, startup, sampling, n_total / sampling))
 
 
 if __name__ == "__main__":
@@ -45,6 +130,13 @@ if __name__ == "__main__":
                         default='1000',
                         type = int,
                         help='Number of steps in the Monte Carlo simulation')
+    parser.add_argument('--backend', '-b',
+                        default='processes',
+                        choices=sorted(BACKENDS),
+                        help='Run the sampling in a process pool or a thread pool')
+    parser.add_argument('--compare',
+                        action='store_true',
+                        help='Run every backend and report startup and throughput side by side')
     args = parser.parse_args()
     start = time.time()
     compute_pi(args)
@@ -4,7 +4,6 @@ import argparse # See https://docs.python.org/3/library/argparse.html
 import random
 from math import pi
 import time
-import matplotlib.pyplot as plt
 
 def sample_pi(n):
     """ Perform n steps of Monte Carlo simulation for estimating Pi/4.
@@ -20,6 +19,8 @@ def sample_pi(n):
 
 
 def compute_pi(args):
+    # Imported here so the sampling workers do not load matplotlib
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots()
     theory_list_x = []
     theory_list_y = []
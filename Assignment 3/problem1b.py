@@ -4,7 +4,6 @@ import argparse # See https://docs.python.org/3/library/argparse.html
 import random
 import time
 from math import pi
-import matplotlib.pyplot as plt
 
 # Each worker runs this function
 def sample_pi(result_queue, seed, batch_size):
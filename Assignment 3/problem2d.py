@@ -7,62 +7,21 @@
 import logging
 import argparse
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.datasets import make_blobs
 import time
 import multiprocessing as mp
+from kmeans_workers import (worker, splitCluster, clusterVariation, chunkSum, chunkDistance,
+                            sampleChunk, assignChunk)
 
 def generateData(n, c):
+    # Imported here, scikit-learn takes long to import and the workers do not need it
+    from sklearn.datasets import make_blobs
     logging.info(f"Generating {n} samples in {c} classes")
     X, y = make_blobs(n_samples=n, centers = c, cluster_std=1.7, shuffle=False,
                       random_state = 2122)
     return X
 
 
-def nearestCentroid(datum, centroids):
-    # norm(a-b) is Euclidean distance, matrix - vector computes difference
-    # for all rows of matrix
-    dist = np.linalg.norm(centroids - datum, axis=1)
-    return np.argmin(dist), np.min(dist)
-
-# Function to assign data points to centroids.
-# Used by the worker function that in turn can be parallelized.
-def assignDataPoints(centroids, data, k):   
-    N = len(data)
-    # The cluster index: c[i] = j indicates that i-th datum is in j-th cluster
-    c = np.zeros(N, dtype=int)
-
-    # Assign data points to nearest centroid
-    variation = np.zeros(k)
-    cluster_sizes = np.zeros(k, dtype=int)
-    for i in range(N):
-        cluster, dist = nearestCentroid(data[i],centroids)
-        c[i] = cluster
-        cluster_sizes[cluster] += 1
-        variation[cluster] += dist**2
-    return c, variation, cluster_sizes
-
-# Function to recompute centroids.
-# Used by the worker function that in turn can be parallelized.
-def recomputeCentroids(assignments, data, k):
-    N = len(data)
-    # Recompute centroids
-    centroids = np.zeros((k,2)) # This fixes the dimension to 2
-    for i in range(N):
-        centroids[assignments[i]] += data[i]        
-    return centroids
-
-# Worker function that can be parallelized
-# Exchanges data through queues with the kmeans function
-def worker(job_queue, result_queue, data, k, i):
-    while True:
-        centroids = job_queue.get()
-        c, variation, cluster_sizes = assignDataPoints(centroids, data, k)
-        sums = recomputeCentroids(c, data, k)
-        result_queue.put((sums, variation, cluster_sizes, c, i))
-
-
-def kmeans(k, data, workers, nr_iter = 100):
+def kmeans(k, data, workers, nr_iter = 100, centroids = None, weights = None):
     start = time.time()
 
     N = len(data)
@@ -70,8 +29,9 @@ def kmeans(k, data, workers, nr_iter = 100):
     # The cluster index: c[i] = j indicates that i-th datum is in j-th cluster
     c = np.zeros(N, dtype=int)
 
-    # Choose k random data points as centroids
-    centroids = data[np.random.choice(np.array(range(N)),size=k,replace=False)]
+    # Choose k random data points as centroids, unless we are refining given centroids
+    if centroids is None:
+        centroids = data[np.random.choice(np.array(range(N)),size=k,replace=False)]
     logging.debug("Initial centroids\n", centroids)
 
     # Queue for data sent to workers
@@ -79,21 +39,19 @@ def kmeans(k, data, workers, nr_iter = 100):
     # Queue for results from workers
     result_queue = mp.Queue()
 
-    # Create start end and ending indexes for splitting data and assignments between workers
+    # Create start and end indexes for splitting data and assignments between workers.
+    # Worker i gets data[indexes[i][0]:indexes[i][1]], the end is exclusive and is
+    # the start of the next slice, so together the slices cover every data point
     indexes = []
     for i in range(workers):
-        indexes.append( ( int((N/workers)*i) , int((N/workers)*(i+1)-1 )) )
-    # Since indexes are rounded down we add the remainder to the last worker
-    # But no need if there is only one worker
-    if (workers > 1):
-        rest = N % workers
-        indexes[:-1][0] = (indexes[:-1][0][0], indexes[:-1][0][1] + rest )
+        indexes.append( ( (N*i) // workers , (N*(i+1)) // workers ) )
 
     # Processes are started here and loaded with slices of the data but are idling while waiting for centroids to be put on queue
     # An index is also sent to keep track on where the splice of data resides in the total data.
     jobs = []
     for i in range(workers):
-        p = mp.Process(target=worker, daemon = True, args=(job_queue, result_queue, data[indexes[i][0]:indexes[i][1]], k, i))
+        part_weights = None if weights is None else weights[indexes[i][0]:indexes[i][1]]
+        p = mp.Process(target=worker, daemon = True, args=(job_queue, result_queue, data[indexes[i][0]:indexes[i][1]], k, i, part_weights))
         jobs.append(p)
         p.start()
 
@@ -110,7 +68,7 @@ def kmeans(k, data, workers, nr_iter = 100):
 
         
 
-        cluster_sizes = np.zeros(k, dtype=int)       
+        cluster_sizes = np.zeros(k)
 
         # Send centroids to job queue to make workers start working.     
         for w in range(workers):
@@ -131,8 +89,7 @@ def kmeans(k, data, workers, nr_iter = 100):
             # And total variation
             total_variation += sum(variation)
             # Assignments are saved but used only once K-means have finished so that we can plot the graph
-            for t in range(len(assignments)):
-                c[int((index* (N/workers) + t))] = assignments[t]
+            c[indexes[index][0]:indexes[index][1]] = assignments
            
         delta_variation = -old_variation
         delta_variation += total_variation
@@ -154,11 +111,11 @@ def kmeans(k, data, workers, nr_iter = 100):
     start = time.time()
     
     # Terminating and then joining every working to avoid zombie processes
-    for i in range(args.workers):
+    for i in range(workers):
         jobs[i].terminate()
         logging.info("Terminated job %6d" % i)   
 
-    for i in range(args.workers):
+    for i in range(workers):
         jobs[i].join()
         logging.info("Joined job %6d" % i)   
    
@@ -176,9 +133,160 @@ def kmeans(k, data, workers, nr_iter = 100):
     time_cleanup = time.time() - start
     print("Time spent on cleanup: %1.5f" % (time_cleanup))
     
+    return total_variation, c, centroids
+
+
+# Bisecting k-means: start with all data in one cluster and keep splitting
+# the clusters with the highest variation in two until there are k of them.
+# Every split only looks at the points of its own cluster, so the work per
+# split shrinks as the clusters get smaller instead of growing with k.
+# Up to one split per worker runs at the same time.
+def bisectingKmeans(k, data, workers, nr_iter = 10):
+    start = time.time()
+    N = len(data)
+    # Every cluster is an array of indexes into data
+    clusters = [np.arange(N)]
+    variations = [clusterVariation(data)]
+    # Clusters that can not be split, for example because all their points are equal
+    final = []
+    seeds = np.random.SeedSequence()
+
+    with mp.Pool(workers) as pool:
+        while len(clusters) + len(final) < k and clusters:
+            # Split the clusters with the highest variation, no more than are still needed
+            nr_splits = min(workers, k - len(clusters) - len(final), len(clusters))
+            order = np.argsort(variations)[::-1]
+            chosen = [clusters[i] for i in order[:nr_splits]]
+            clusters = [clusters[i] for i in order[nr_splits:]]
+            variations = [variations[i] for i in order[nr_splits:]]
+
+            tasks = [(data[indexes], nr_iter, seed) for indexes, seed
+                     in zip(chosen, seeds.spawn(len(chosen)))]
+            for indexes, c in zip(chosen, pool.map(splitCluster, tasks)):
+                halves = [indexes[c == 0], indexes[c == 1]]
+                if len(halves[0]) == 0 or len(halves[1]) == 0:
+                    final.append(indexes)
+                    continue
+                for half in halves:
+                    if len(half) > 1:
+                        clusters.append(half)
+                        variations.append(clusterVariation(data[half]))
+                    else:
+                        final.append(half)
+            logging.info("%d clusters" % (len(clusters) + len(final)))
+
+    c = np.zeros(N, dtype=int)
+    centroids = np.zeros((len(clusters) + len(final), 2))
+    total_variation = 0.0
+    for i, indexes in enumerate(clusters + final):
+        c[indexes] = i
+        centroids[i] = data[indexes].mean(axis=0)
+        total_variation += clusterVariation(data[indexes])
+
+    print("Time spent on bisecting: %1.5f" % (time.time() - start))
+    return total_variation, c, centroids
+
+
+# Lightweight coreset, see Bachem, Lucic and Krause, "Scalable k-Means
+# Clustering via Lightweight Coresets" (2018). Point x is sampled with
+# probability q(x) = 1/2 * 1/N + 1/2 * d(x, mean)^2 / sum of d(y, mean)^2
+# and weighted with 1 / (m q(x)), so weighted sums over the m sampled points
+# estimate sums over all N points. Clustering the weighted sample gives
+# centroids almost as good as clustering all data.
+#
+# Chunks of the data are handled in parallel: one pass for the mean, one for
+# the sum of squared distances of every chunk and one drawing each chunk's
+# share of the sample.
+
+def buildCoreset(data, workers, m):
+    N = len(data)
+    chunks = np.array_split(data, workers * 4)
+    seeds = np.random.SeedSequence()
+    with mp.Pool(workers) as pool:
+        mean = sum(pool.map(chunkSum, chunks)) / N
+        distances = np.array(pool.map(chunkDistance, [(chunk, mean) for chunk in chunks]))
+        total_distance = distances.sum()
+        # Every chunk gets a share of the sample in proportion to its total probability
+        shares = np.array([0.5 * len(chunk) / N for chunk in chunks]) + 0.5 * distances / total_distance
+        nr_samples = np.random.default_rng(seeds.spawn(1)[0]).multinomial(m, shares / shares.sum())
+        tasks = [(chunk, mean, N, total_distance, n, m, seed)
+                 for chunk, n, seed in zip(chunks, nr_samples, seeds.spawn(len(chunks)))]
+        samples = pool.map(sampleChunk, tasks)
+    return (np.concatenate([points for points, weights in samples]),
+            np.concatenate([weights for points, weights in samples]))
+
+def coresetKmeans(k, data, workers, m, nr_iter = 100):
+    start = time.time()
+    points, weights = buildCoreset(data, workers, m)
+    print("Time spent on building a coreset of %d points: %1.5f" % (len(points), time.time() - start))
+
+    coreset_variation, c, centroids = kmeans(k, points, workers, nr_iter = nr_iter, weights = weights)
+
+    # Final assignment of all data to the centroids found on the coreset
+    start = time.time()
+    chunks = np.array_split(data, workers * 4)
+    with mp.Pool(workers) as pool:
+        results = pool.map(assignChunk, [(centroids, chunk, k) for chunk in chunks])
+    c = np.concatenate([assignments for assignments, variation in results])
+    total_variation = sum(variation for assignments, variation in results)
+    print("Time spent on assigning all data: %1.5f" % (time.time() - start))
+    logging.info("Variation estimated on the coreset %f" % coreset_variation)
     return total_variation, c
 
 
+def clusterData(args, X):
+    """ Cluster X with the method the arguments select,
+        returns the total variation, the assignment and the method's name."""
+    if args.bisecting:
+        total_variation, assignment, centroids = bisectingKmeans(args.k_clusters, X, args.workers,
+                                                                 nr_iter = args.iterations)
+        # A few global iterations let points move between clusters of different splits
+        if args.refine > 0:
+            total_variation, assignment, centroids = kmeans(len(centroids), X, args.workers,
+                                                            nr_iter = args.refine, centroids = centroids)
+        return total_variation, assignment, "bisecting"
+    if args.coreset > 0:
+        total_variation, assignment = coresetKmeans(args.k_clusters, X, args.workers, args.coreset,
+                                                    nr_iter = args.iterations)
+        return total_variation, assignment, "coreset"
+    total_variation, assignment, centroids = kmeans(args.k_clusters, X, args.workers,
+                                                    nr_iter = args.iterations)
+    return total_variation, assignment, "full k-means"
+
+
+# Clusters all data the usual way for reference. Both results depend on the
+# random initial centroids and the coreset on its sample too, so a single
+# pair of runs says little. The ratios are reported over --repeat pairs, the
+# first run of the method being the one computeClustering already made.
+def compareCoreset(args, X, variation, elapsed, method):
+    quality = []
+    speed = []
+    rows = []
+    for r in range(args.repeat):
+        if r > 0:
+            start_time = time.time()
+            variation, assignment, method = clusterData(args, X)
+            elapsed = time.time() - start_time
+        start_time = time.time()
+        full_variation, full_assignment, centroids = kmeans(args.k_clusters, X, args.workers,
+                                                            nr_iter = args.iterations)
+        full_time = time.time() - start_time
+        rows.append((r + 1, method, variation, elapsed))
+        rows.append((r + 1, "full k-means", full_variation, full_time))
+        quality.append(variation / full_variation)
+        speed.append(elapsed / full_time)
+    # The clustering functions print their own timings, so the table comes last
+    print("Run\tMethod\t\tVariation\tTime [s]")
+    for row in rows:
+        print("%d\t%-12s\t%f\t%1.5f" % row)
+    print("Ratio of %s to full k-means over %d runs" % (method, len(quality)))
+    print("Ratio\t\tMean\tMin\tMax\tStd")
+    for name, ratios in (("Variation", quality), ("Time", speed)):
+        ratios = np.array(ratios)
+        print("%-9s\t%1.3f\t%1.3f\t%1.3f\t%1.3f"
+              % (name, ratios.mean(), ratios.min(), ratios.max(), ratios.std()))
+
+
 def computeClustering(args):
     if args.verbose:
         logging.basicConfig(format='# %(message)s',level=logging.INFO)
@@ -191,16 +299,20 @@ def computeClustering(args):
     start_time = time.time()
     #
     # Modify kmeans code to use args.worker parallel threads
-    total_variation, assignment = kmeans(args.k_clusters, X, args.workers, nr_iter = args.iterations)
+    total_variation, assignment, method = clusterData(args, X)
     #
     #
     total_time = time.time() - start_time
     logging.info("Clustering complete in %3.2f [s]" % (total_time))
     print(f"Total variation {total_variation}")
     print("Total time spent: %1.5f" % (total_time))
-    
+
+    if args.coreset > 0 and args.compare:
+        compareCoreset(args, X, total_variation, total_time, method)
+
 
     if args.plot: # Assuming 2D data
+        import matplotlib.pyplot as plt
         fig, axes = plt.subplots(nrows=1, ncols=1)
         axes.scatter(X[:, 0], X[:, 1], c=assignment, alpha=0.2)
         plt.title("k-means result")
@@ -237,6 +349,24 @@ if __name__ == "__main__":
     parser.add_argument('--plot', '-p',
                         type = str,
                         help='Filename to plot the final result')   
+    parser.add_argument('--bisecting', '-b',
+                        action='store_true',
+                        help='Use bisecting k-means, --iterations is then the number of 2-means iterations per split')
+    parser.add_argument('--refine', '-r',
+                        default='0',
+                        type = int,
+                        help='With --bisecting, number of k-means iterations over all data afterwards')
+    parser.add_argument('--coreset',
+                        default='0',
+                        type = int,
+                        help='Cluster a weighted coreset of this many points instead of all data')
+    parser.add_argument('--compare',
+                        action='store_true',
+                        help='With --coreset, also cluster all data and compare time and variation')
+    parser.add_argument('--repeat',
+                        default='5',
+                        type = int,
+                        help='With --compare, number of coreset and full data runs the ratios are averaged over')
     parser.add_argument('--verbose', '-v',
                         action='store_true',
                         help='Print verbose diagnostic output')
@@ -0,0 +1,237 @@
+import math
+import os
+import random
+import sys
+import tempfile
+from statistics import NormalDist
+import numpy as np
+import statsutil
+import local_engine
+
+# Approximate statistics from a sample of blocks of the input.
+#
+# The input is split into line aligned byte ranges (blocks) and blocks are
+# read in random order, a few more every round, until the confidence
+# intervals of the mean and the standard deviation are within the requested
+# relative error. The cost depends on the precision asked for and not on
+# the size of the input, since unread blocks are never touched.
+#
+# Values in a block are not independent of each other if the file is
+# ordered in some way, so the variance of the mean is estimated from the
+# spread between blocks (cluster sampling, ratio estimator). The resulting
+# design effect gives an effective sample size that the other intervals use.
+#
+# Only the mean and the standard deviation are checked against --rel-error.
+# The median, the mean deviation and the histogram get confidence bounds
+# too, but reading stops without regard to them.
+
+
+def add_approximate_args(add_argument):
+    add_argument('--rel-error',
+                 default=0.01,
+                 type=float,
+                 help='With --approximate, sample until the mean and standard deviation '
+                      'are known within this relative error')
+    add_argument('--confidence',
+                 default=0.95,
+                 type=float,
+                 help='With --approximate, confidence level of the reported bounds')
+    add_argument('--block-size',
+                 default=1.0,
+                 type=float,
+                 help='With --approximate, size of the sampled blocks in MB')
+    add_argument('--initial-blocks',
+                 default=8,
+                 type=int,
+                 help='With --approximate, blocks read in the first round, doubled every round')
+    add_argument('--seed',
+                 default=None,
+                 type=int,
+                 help='With --approximate, seed for the order the blocks are read in')
+
+
+def plan_blocks(path, options):
+    """ Every block of the file in the random order they will be read."""
+    blocks = local_engine.split_file(path, max(1, int(options.block_size * (1 << 20))))
+    random.Random(options.seed).shuffle(blocks)
+    return blocks
+
+
+def read_block_values(block):
+    ids, groups, values = local_engine.columnar.parse_text(local_engine.read_chunk(*block))
+    return values
+
+
+def block_summary(block, options, center=None):
+    """ Summary of the values of one block. Only these are sent back from
+        the mappers or Spark tasks, not the values themselves. The sum of
+        |x - center| takes the place of the mean deviation, center being
+        the mean estimated so far, or the block's own mean before that."""
+    values = read_block_values(block)
+    if center is None:
+        center = float(values.mean()) if len(values) else 0.0
+    return statsutil.summary_from_array(values, options, center)
+
+
+def sketch_central_moment(sketch, mean, power):
+    weighted = [(item, 2 ** h) for h, items in enumerate(sketch[1]) for item in items]
+    total = sum(w for _, w in weighted)
+    return sum(w * (item - mean) ** power for item, w in weighted) / total
+
+
+def estimate(samples, nr_blocks, total_bytes, options):
+    """ Estimates with the half width of their confidence interval,
+        samples is a list of (block, summary, center) triples, see
+        block_summary. The mean, the standard deviation, the mean deviation
+        and the histogram are exact for the sampled rows, the median and the
+        kurtosis come from the merged quantile sketch."""
+    z = NormalDist().inv_cdf((1 + options.confidence) / 2)
+    counts = np.array([summary[0][0] for block, summary, center in samples], dtype=np.float64)
+    sums = np.array([summary[0][0] * summary[0][1] for block, summary, center in samples])
+    centers = np.array([center for block, summary, center in samples])
+    merged = statsutil.new_summary(options)
+    for block, summary, center in samples:
+        statsutil.merge_summaries(merged, summary)
+    moments, hist, sketch, abs_dev = merged
+    n, m = moments[0], len(samples)
+    # Finite population correction, all bounds shrink to zero once every block is read
+    fpc = 1.0 - float(m) / nr_blocks
+
+    mean = sums.sum() / n
+    variance = moments[2] / (n - 1) if n > 1 else 0.0
+    if m > 1:
+        mean_var = fpc * ((sums - mean * counts) ** 2).sum() / (m * (m - 1) * (n / m) ** 2)
+    elif fpc == 0:
+        mean_var = 0.0
+    else:
+        mean_var = float('inf')
+    srs_var = fpc * variance / n
+    design_effect = mean_var / srs_var if srs_var > 0 else 1.0
+    n_eff = n / max(1.0, design_effect)
+
+    std = math.sqrt(variance)
+    kurtosis = sketch_central_moment(sketch, mean, 4) / variance ** 2 if variance > 0 else 1.0
+    std_half = z * std * math.sqrt(fpc * max(kurtosis - 1, 0.0) / (4 * n_eff))
+
+    # The blocks summed |x - center| instead of |x - mean|. Moving the center
+    # by d changes every term by at most |d|, which is added to the bound.
+    # The variance of |x - mean| is the variance minus the squared mean deviation.
+    mean_dev = abs_dev / n
+    shift = (counts * np.abs(centers - mean)).sum() / n
+    mean_dev_half = z * math.sqrt(max(variance - mean_dev ** 2, 0.0) * fpc / n_eff) if n > 1 else float('inf')
+    mean_dev_half += shift
+
+    # The sketch adds its own rank error to that of the sample
+    rank_half = z * math.sqrt(fpc * 0.25 / n_eff) + statsutil.sketch_rank_error(sketch[0])
+    median, low, high = statsutil.sketch_quantiles(sketch, [0.5, max(0.0, 0.5 - rank_half),
+                                                            min(1.0, 0.5 + rank_half)])
+    median_half = max(median - low, high - median)
+
+    sampled_bytes = sum(block[2] - block[1] for block, summary, center in samples)
+    rows = n * float(total_bytes) / sampled_bytes
+
+    results = [
+        ("Sampled blocks: ", [m, nr_blocks]),
+        ("Sampled rows: ", n),
+        ("Rows: ", rows),
+        ("Standard deviation: ", [std, std_half]),
+        ("Mean deviation: ", [float(mean_dev), float(mean_dev_half)]),
+        ("Mean: ", [float(mean), z * math.sqrt(mean_var)]),
+        ("Median: ", [float(median), float(median_half)]),
+    ]
+    labels = statsutil.histogram_labels(options.hist_min, options.hist_max, options.bins)
+    for label, count in zip(labels, hist):
+        p = float(count) / n
+        results.append((label, [rows * p, z * rows * math.sqrt(fpc * p * (1 - p) / n_eff)]))
+    return results
+
+
+def relative_error(results):
+    results = dict(results)
+    mean, mean_half = results["Mean: "]
+    std, std_half = results["Standard deviation: "]
+    return max(_relative(mean_half, mean), _relative(std_half, std))
+
+
+def _relative(half, value):
+    # A bound of 0 is exact even when the value is 0
+    if half == 0:
+        return 0.0
+    return half / abs(value) if value else float('inf')
+
+
+def run_sampling(path, options, read_blocks):
+    """ Sample blocks of path until options.rel_error is met.
+        read_blocks is called with a list of blocks and the center for
+        block_summary and returns their summaries, which is where the
+        MRJob and Spark jobs plug in.
+        If every block is read before the error is small enough, the last
+        estimate is returned with "Error bound reached: " set to False."""
+    blocks = plan_blocks(path, options)
+    total_bytes = os.path.getsize(path)
+    samples = []
+    results = []
+    batch = options.initial_blocks
+    while True:
+        todo = blocks[len(samples):len(samples) + batch]
+        center = dict(results)["Mean: "][0] if results else None
+        for block, summary in zip(todo, read_blocks(todo, center)):
+            samples.append((block, summary, summary[0][1] if center is None else center))
+        # Blocks past the end of the file, or between lines, hold no values
+        filled = [sample for sample in samples if sample[1][0][0]]
+        error = float('inf')
+        if filled:
+            results = estimate(filled, len(blocks), total_bytes, options)
+            error = relative_error(results)
+            sys.stderr.write("Read %d of %d blocks, relative error %1.5f\n"
+                             % (len(samples), len(blocks), error))
+        if error <= options.rel_error:
+            return results + [("Error bound reached: ", True)]
+        if len(samples) == len(blocks):
+            # A mean or standard deviation of 0 has no finite relative error
+            sys.stderr.write("Relative error %g not reached after reading every block\n"
+                             % options.rel_error)
+            return results + [("Error bound reached: ", False)]
+        batch = len(samples)
+
+
+def block_ref(block):
+    return "%s\t%d\t%d" % block
+
+
+def read_block_ref(line):
+    path, start, end = line.rsplit('\t', 2)
+    return (path, int(start), int(end))
+
+
+def run_approximate(job_class, args):
+    """ Driver for the MRJob jobs. Every round writes the blocks to read
+        to a file and runs the job on it, the job's mappers read the blocks
+        and send a summary of each block back, see Problem1a.approximate_mapper."""
+    job = job_class(args)
+    if len(job.options.args) != 1:
+        raise ValueError("--approximate works on a single local input file")
+    if job.options.mean is not None:
+        raise ValueError("--approximate estimates the mean itself, --mean can not be given")
+    path = os.path.abspath(job.options.args[0])
+    base_args = [arg for arg in args if arg != job.options.args[0]]
+
+    def read_blocks(blocks, center):
+        # The mappers take the center from --mean, see Problem1a.approximate_mapper
+        center_args = ['--mean', repr(center)] if center is not None else []
+        fd, block_list = tempfile.mkstemp(prefix='blocks', suffix='.txt')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                for block in blocks:
+                    f.write(block_ref(block) + "\n")
+            summaries = dict((tuple(key), summary)
+                             for key, summary in statsutil.run_job(job_class, base_args + center_args + [block_list]))
+        finally:
+            os.remove(block_list)
+        empty = statsutil.new_summary(job.options)
+        return [summaries.get(block, empty) for block in blocks]
+
+    protocol = job.output_protocol()
+    for key, value in run_sampling(path, job.options, read_blocks):
+        sys.stdout.buffer.write(protocol.write(key, value) + b"\n")
+    sys.stdout.flush()
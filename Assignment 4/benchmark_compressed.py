@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+import argparse
+import gzip
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+import statsutil
+import columnar
+import blockzip
+import local_engine
+
+# Compares how fast the local engine summarizes the same data stored as
+# plain text, as one gzip stream and as block compressed files. Text and
+# block compressed files are read by all workers in parallel, a gzip stream
+# has to be decompressed from the start by a single process.
+
+def scan_gzip(path, options, read_size=16 << 20):
+    """ Summary of a plain gzip file, decompressed and parsed as one stream."""
+    summary = statsutil.new_summary(options)
+    rest = b''
+    with gzip.open(path, 'rb') as f:
+        while True:
+            data = f.read(read_size)
+            if not data:
+                break
+            data = rest + data
+            # Parse whole lines, the rest goes in front of the next read
+            end = data.rfind(b'\n') + 1
+            rest = data[end:]
+            statsutil.merge_summaries(summary, statsutil.summary_from_array(
+                columnar.parse_text(data[:end])[2], options))
+    return statsutil.merge_summaries(summary, statsutil.summary_from_array(
+        columnar.parse_text(rest)[2], options))
+
+
+def scan_parallel(pool, path, options):
+    chunks = local_engine.split_input(path, max(1, int(options.chunk_size * (1 << 20))))
+    lines, summary = local_engine.run_pass(pool, chunks, options)
+    return summary
+
+
+def prepare(args, directory):
+    """ Write the input in every format, return (name, path, scan) triples."""
+    inputs = [("text", args.file, 'parallel')]
+    plain = os.path.join(directory, 'plain.gz')
+    with open(args.file, 'rb') as src, gzip.open(plain, 'wb', compresslevel=args.level) as out:
+        shutil.copyfileobj(src, out, 16 << 20)
+    inputs.append(("gzip", plain, 'single'))
+    for codec in args.codecs.split(','):
+        path = os.path.join(directory, 'blocks.' + codec)
+        try:
+            blockzip.convert(args.file, path, codec, args.level, args.block_rows, args.workers)
+        except ImportError as e:
+            sys.stderr.write("Skipping %s blocks: %s\n" % (codec, e))
+            continue
+        inputs.append(("%s blocks" % codec, path, 'parallel'))
+    return inputs
+
+
+def benchmark(args):
+    raw_size = os.path.getsize(args.file)
+    directory = tempfile.mkdtemp(prefix='benchmark_compressed')
+    try:
+        inputs = prepare(args, directory)
+        print("Input\t\tSize [MB]\tTime [s]\tMB/s uncompressed\tLines")
+        with mp.Pool(args.workers) as pool:
+            for name, path, scan in inputs:
+                times = []
+                for i in range(args.repeat):
+                    start = time.time()
+                    if scan == 'single':
+                        summary = scan_gzip(path, args)
+                    else:
+                        summary = scan_parallel(pool, path, args)
+                    times.append(time.time() - start)
+                best = min(times)
+                print("%-12s\t%1.1f\t\t%1.3f\t\t%1.1f\t\t\t%d"
+                      % (name, os.path.getsize(path) / 1e6, best, raw_size / 1e6 / best, summary[0][0]))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compare the throughput of text, gzip and block compressed inputs',
+        epilog = 'Example: benchmark_compressed.py --file big.dat --workers 8 --codecs gzip,zstd'
+    )
+    parser.add_argument('--file', '-f',
+                        required=True,
+                        type = str,
+                        help='Text file to convert and read')
+    parser.add_argument('--workers', '-w',
+                        default=mp.cpu_count(),
+                        type = int,
+                        help='Number of parallel processes')
+    parser.add_argument('--codecs',
+                        default='gzip,zstd',
+                        type = str,
+                        help='Comma separated block codecs to compare')
+    parser.add_argument('--level', '-l',
+                        default=6,
+                        type = int,
+                        help='Compression level')
+    parser.add_argument('--block-rows', '-b',
+                        default=1 << 18,
+                        type = int,
+                        help='Number of rows in each compressed block')
+    parser.add_argument('--chunk-size',
+                        default=16,
+                        type = float,
+                        help='Size of the byte ranges of the text input in MB')
+    parser.add_argument('--repeat',
+                        default=3,
+                        type = int,
+                        help='Number of runs, the fastest one is reported')
+    statsutil.add_summary_args(parser.add_argument)
+    args = parser.parse_args()
+    args.mean = None
+    args.group = -1
+    args.all_groups = False
+    benchmark(args)
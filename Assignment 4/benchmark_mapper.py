@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+import argparse
+import time
+import statsutil
+from problem1a import Problem1a
+
+# Compares problem1a.py with in-mapper aggregation against a mapper that
+# emits one record per input line, which is how the job used to work.
+
+class PerLineProblem1a(Problem1a):
+
+    def mapper_init(self):
+        pass
+
+    def mapper(self, _, line):
+        value = float(line.split()[2])
+        summary = statsutil.summary_add(statsutil.new_summary(self.options), value, self.options)
+        yield ("stats", summary)
+
+    def mapper_final(self):
+        pass
+
+
+def shuffle_size(job_class, path):
+    """ Run the mapper of job_class over path in this process and return the
+        number of records and bytes it sends to the shuffle, and the time it took."""
+    job = job_class([path])
+    # Outside a task every counter update is printed to stderr
+    job.increment_counter = lambda group, counter, amount=1: None
+    protocol = job.internal_protocol()
+    records = 0
+    nr_bytes = 0
+    start = time.time()
+    output = []
+    with open(path) as f:
+        job.mapper_init()
+        for line in f:
+            output.extend(job.mapper(None, line.rstrip('\n')) or ())
+        output.extend(job.mapper_final() or ())
+    for key, value in output:
+        records += 1
+        nr_bytes += len(protocol.write(key, value)) + 1
+    return records, nr_bytes, time.time() - start
+
+
+def job_time(job_class, path, runner):
+    start = time.time()
+    statsutil.run_job(job_class, ['-r', runner, '--quiet', path])
+    return time.time() - start
+
+
+def benchmark(args):
+    print("Mapper\t\tRecords\tBytes\t\tMap time [s]\tJob time [s]")
+    for name, job_class in (("per line", PerLineProblem1a), ("in mapper", Problem1a)):
+        records, nr_bytes, map_time = shuffle_size(job_class, args.file)
+        total = min(job_time(job_class, args.file, args.runner) for i in range(args.repeat))
+        print("%-9s\t%d\t%-9d\t%1.5f\t\t%1.5f" % (name, records, nr_bytes, map_time, total))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Measure the shuffle size and runtime of the problem1a mapper',
+        epilog = 'Example: benchmark_mapper.py --file testdata.dat --runner local'
+    )
+    parser.add_argument('--file', '-f',
+                        default='testdata.dat',
+                        type = str,
+                        help='File to process')
+    parser.add_argument('--runner', '-r',
+                        default='inline',
+                        type = str,
+                        help='mrjob runner to time the whole job with')
+    parser.add_argument('--repeat',
+                        default=3,
+                        type = int,
+                        help='Number of runs, the fastest one is reported')
+    args = parser.parse_args()
+    benchmark(args)
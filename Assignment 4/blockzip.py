@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+import argparse
+import collections
+import gzip
+import itertools
+import multiprocessing as mp
+import os
+import struct
+import numpy as np
+
+# Block compressed text files. A plain gzip file can only be read from the
+# start, so one task has to decompress all of it. Here the text is cut into
+# blocks of whole lines that are compressed independently and written one
+# after the other, and a sidecar index (the file name with .idx appended)
+# records where every block starts:
+#
+#   header  magic, codec, number of blocks
+#   index   (offset, compressed size, rows, uncompressed size) of every block
+#
+# Any block can be decompressed on its own, so the blocks are spread over
+# mappers, Spark tasks or pool workers like the blocks of a columnar file.
+# Concatenated gzip members and concatenated zstd frames are themselves valid
+# gzip and zstd files, so zcat and zstdcat still read the data file as is.
+#
+# zstd needs the zstandard package, gzip works with the standard library.
+
+MAGIC = b'DATBLK01'
+HEADER = struct.Struct('<8s8sQ')
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('size', '<u8'), ('rows', '<u8'), ('raw_size', '<u8')])
+CODECS = ['gzip', 'zstd']
+
+# A block of a block compressed file, local_engine hands these to its workers
+Block = collections.namedtuple('Block', ['path', 'block'])
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd blocks need the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def compress(data, codec, level):
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=level)
+    # The frame records the uncompressed size, which decompress relies on
+    return _zstandard().ZstdCompressor(level=level).compress(data)
+
+
+def decompress(data, codec):
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    return _zstandard().ZstdDecompressor().decompress(data)
+
+
+def index_path(path):
+    return path + '.idx'
+
+
+def write_index(path, codec, entries):
+    """ Write the index of path, entries are (offset, size, rows, raw_size) per block."""
+    with open(index_path(path), 'wb') as f:
+        f.write(HEADER.pack(MAGIC, codec.encode(), len(entries)))
+        f.write(np.array(entries, dtype=INDEX_DTYPE).tobytes())
+
+
+def is_blockzip(path):
+    if not os.path.exists(index_path(path)):
+        return False
+    with open(index_path(path), 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_index(path):
+    """ Return the codec and the index entries of path."""
+    with open(index_path(path), 'rb') as f:
+        magic, codec, nr_blocks = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("%s is not the index of a block compressed file" % index_path(path))
+        index = np.frombuffer(f.read(nr_blocks * INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)
+    return codec.rstrip(b'\0').decode(), index
+
+
+def read_block(path, block, index=None):
+    """ Return the uncompressed text lines of one block."""
+    codec, entries = read_index(path) if index is None else index
+    with open(path, 'rb') as f:
+        f.seek(int(entries[block]['offset']))
+        return decompress(f.read(int(entries[block]['size'])), codec)
+
+
+def text_blocks(path, block_rows):
+    """ Blocks of block_rows whole lines of a text file, or of a plain gzip file."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as src:
+        while True:
+            lines = [line for _, line in zip(range(block_rows), src)]
+            if not lines:
+                break
+            if not lines[-1].endswith(b'\n'):
+                lines[-1] += b'\n'
+            yield b''.join(lines), len(lines)
+
+
+def compress_block(task):
+    data, rows, codec, level = task
+    return compress(data, codec, level), rows, len(data)
+
+
+def convert(in_path, out_path, codec, level, block_rows, workers):
+    entries = []
+    with mp.Pool(workers) as pool, open(out_path, 'wb') as out:
+        blocks = text_blocks(in_path, block_rows)
+        while True:
+            # A few blocks per worker at a time, so the input is not read into memory all at once
+            batch = [(data, rows, codec, level) for data, rows in itertools.islice(blocks, 4 * workers)]
+            if not batch:
+                break
+            for data, rows, raw_size in pool.map(compress_block, batch):
+                entries.append((out.tell(), len(data), rows, raw_size))
+                out.write(data)
+    write_index(out_path, codec, entries)
+    return sum(rows for _, _, rows, _ in entries), len(entries)
+
+
+def manifest(path):
+    """ One line per block, used as the input of the MRJob jobs so that
+        every mapper gets whole blocks to decompress."""
+    path = os.path.abspath(path)
+    return ["%s\t%d" % (path, block) for block in range(len(read_index(path)[1]))]
+
+
+def read_block_ref(line):
+    path, block = line.rsplit('\t', 1)
+    return read_block(path, int(block))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert testdata.dat style files, plain or gzipped, to block compressed files',
+        epilog = 'Example: blockzip.py convert big.dat.gz big.bgz --codec zstd && '
+                 'blockzip.py manifest big.bgz > big.blocks'
+    )
+    parser.add_argument('command',
+                        choices=['convert', 'manifest'],
+                        help='convert a text file, or list the blocks of a converted file')
+    parser.add_argument('input',
+                        type = str,
+                        help='File to read, files ending in .gz are decompressed first')
+    parser.add_argument('output',
+                        nargs='?',
+                        type = str,
+                        help='File to write when converting, the index is written next to it')
+    parser.add_argument('--codec', '-c',
+                        default='gzip',
+                        choices=CODECS,
+                        help='Compression of the blocks')
+    parser.add_argument('--level', '-l',
+                        default=6,
+                        type = int,
+                        help='Compression level')
+    parser.add_argument('--block-rows', '-b',
+                        default=1 << 18,
+                        type = int,
+                        help='Number of rows in each block')
+    parser.add_argument('--workers', '-w',
+                        default=mp.cpu_count(),
+                        type = int,
+                        help='Number of parallel processes compressing blocks')
+    args = parser.parse_args()
+    if args.command == 'convert':
+        if args.output is None:
+            parser.error('convert needs an output file')
+        nr_rows, nr_blocks = convert(args.input, args.output, args.codec, args.level,
+                                     args.block_rows, args.workers)
+        print("Wrote %d rows in %d blocks to %s" % (nr_rows, nr_blocks, args.output))
+    else:
+        for line in manifest(args.input):
+            print(line)
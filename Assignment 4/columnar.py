@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+import argparse
+import os
+import struct
+import numpy as np
+
+# Columnar binary layout for testdata.dat style files (id, group, value).
+#
+#   header  magic, rows per block, number of blocks, number of rows, index offset
+#   block   ids as int64, then groups as int32, then values as float64
+#   ...
+#   index   (offset, rows) of every block
+#
+# Every column of a block is a contiguous little endian array, so a block is
+# decoded by pointing NumPy at the bytes instead of parsing text.
+# Blocks can be read independently, which makes the file splittable.
+
+MAGIC = b'DATCOL01'
+HEADER = struct.Struct('<8sIIQQ')
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('rows', '<u8')])
+ROW_BYTES = 8 + 4 + 8
+
+
+def parse_text(data):
+    """ Parse bytes holding whole text lines into id, group and value arrays."""
+    fields = np.array(data.split(), dtype=np.float64).reshape(-1, 3)
+    return fields[:, 0].astype(np.int64), fields[:, 1].astype(np.int32), fields[:, 2]
+
+
+def parse_lines(lines):
+    """ Parse a list of text lines into id, group and value arrays."""
+    return parse_text(b' '.join(lines))
+
+
+def convert(text_path, out_path, block_rows):
+    index = []
+    with open(text_path, 'rb') as src, open(out_path, 'wb') as out:
+        out.write(b'\0' * HEADER.size)
+        nr_rows = 0
+        while True:
+            lines = [line for _, line in zip(range(block_rows), src) if line.strip()]
+            if not lines:
+                break
+            ids, groups, values = parse_lines(lines)
+            index.append((out.tell(), len(ids)))
+            out.write(ids.astype('<i8').tobytes())
+            out.write(groups.astype('<i4').tobytes())
+            out.write(values.astype('<f8').tobytes())
+            nr_rows += len(ids)
+        index_offset = out.tell()
+        out.write(np.array(index, dtype=INDEX_DTYPE).tobytes())
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, block_rows, len(index), nr_rows, index_offset))
+    return nr_rows, len(index)
+
+
+def is_columnar(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        magic, block_rows, nr_blocks, nr_rows, index_offset = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("%s is not a columnar data file" % path)
+    return block_rows, nr_blocks, nr_rows, index_offset
+
+
+def read_index(path):
+    block_rows, nr_blocks, nr_rows, index_offset = read_header(path)
+    return np.fromfile(path, dtype=INDEX_DTYPE, count=nr_blocks, offset=index_offset)
+
+
+def read_block(path, block, index=None):
+    """ Return the ids, groups and values of one block as NumPy arrays
+        backed by a memory map of the file."""
+    if index is None:
+        index = read_index(path)
+    offset, rows = int(index[block]['offset']), int(index[block]['rows'])
+    data = np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(rows * ROW_BYTES,))
+    ids = data[:rows * 8].view('<i8')
+    groups = data[rows * 8:rows * 12].view('<i4')
+    values = data[rows * 12:].view('<f8')
+    return ids, groups, values
+
+
+def manifest(path):
+    """ One line per block, used as the input of the MRJob jobs so that
+        every mapper gets whole blocks to decode."""
+    path = os.path.abspath(path)
+    return ["%s\t%d" % (path, block) for block in range(read_header(path)[1])]
+
+
+def read_block_ref(line):
+    path, block = line.rsplit('\t', 1)
+    return read_block(path, int(block))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert testdata.dat style files to the columnar binary layout',
+        epilog = 'Example: columnar.py convert testdata.dat testdata.col && '
+                 'columnar.py manifest testdata.col > testdata.blocks'
+    )
+    parser.add_argument('command',
+                        choices=['convert', 'manifest'],
+                        help='convert a text file, or list the blocks of a converted file')
+    parser.add_argument('input',
+                        type = str,
+                        help='File to read')
+    parser.add_argument('output',
+                        nargs='?',
+                        type = str,
+                        help='File to write when converting')
+    parser.add_argument('--block-rows', '-b',
+                        default=1 << 16,
+                        type = int,
+                        help='Number of rows in each block')
+    args = parser.parse_args()
+    if args.command == 'convert':
+        if args.output is None:
+            parser.error('convert needs an output file')
+        nr_rows, nr_blocks = convert(args.input, args.output, args.block_rows)
+        print("Wrote %d rows in %d blocks to %s" % (nr_rows, nr_blocks, args.output))
+    else:
+        for line in manifest(args.input):
+            print(line)
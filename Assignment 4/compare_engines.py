@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+import argparse
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import time
+import numpy as np
+import statsutil
+import numpy_engine
+
+# Runs every engine on the same input and checks their results against an
+# exact NumPy reference, then reports how fast each one was.
+#
+# Counts and values computed exactly have to match: moments, minimum and
+# maximum up to rounding, histogram counts exactly. Engines that estimate
+# quantiles with the sketch pass when the rank of their answer is within
+# --rank-error of the quantile asked for. The Spark jobs print their own
+# report with six decimals and a histogram over [minimum, maximum]; they are
+# run when pyspark can be imported.
+#
+# The summary options (--bins, --hist-min, --hist-max, --percentiles and
+# --sketch-k) are passed on to every engine that takes them. A key of the
+# reference that an engine's output format does not have is listed as
+# excluded, any other key missing from its output is a mismatch.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPARK = os.path.join(HERE, '..', 'Assignment 5')
+
+
+def summary_args(options):
+    return ['--bins', str(options.bins), '--hist-min', repr(options.hist_min),
+            '--hist-max', repr(options.hist_max), '--percentiles', options.percentiles,
+            '--sketch-k', str(options.sketch_k)]
+
+
+def json_engine(script, *extra):
+    return lambda path, options: ([sys.executable, os.path.join(HERE, script)] + list(extra)
+                                  + summary_args(options) + [path])
+
+
+def file_engine(directory, script, *extra):
+    return lambda path, options: ([sys.executable, os.path.join(directory, script)] + list(extra)
+                                  + summary_args(options) + ['--file', path])
+
+
+def fixed_engine(directory, script, *extra):
+    # For engines without the summary options
+    return lambda path, options: [sys.executable, os.path.join(directory, script)] + list(extra) + ['--file', path]
+
+
+ENGINES = [
+    ("numpy", file_engine(HERE, 'numpy_engine.py'), 'json'),
+    ("local", file_engine(HERE, 'local_engine.py'), 'json'),
+    ("mrjob 1a", json_engine('problem1a.py'), 'json'),
+    ("mrjob 1d", json_engine('problem1d.py'), 'json'),
+    ("mrjob double", json_engine('double-map-reduce.py'), 'json'),
+    ("mrjob 1a local", json_engine('problem1a.py', '-r', 'local'), 'json'),
+    ("spark rdd", file_engine(SPARK, 'problem1a.py'), 'spark'),
+    ("spark df", fixed_engine(SPARK, 'problem1a_df.py'), 'spark'),
+]
+
+
+def parse_json(output):
+    results = {}
+    for line in output.decode().splitlines():
+        key, value = line.split('\t', 1)
+        results[json.loads(key)] = json.loads(value)
+    return results
+
+
+SPARK_KEYS = ['Maximum', 'Minimum', 'Mean deviation', 'Standard deviation', 'Median']
+SPARK_LINE = re.compile(r'(%s) ?: (\S+)' % '|'.join(SPARK_KEYS))
+SPARK_BUCKET = re.compile(r'Bucket (\d+) = .* : (\d+)')
+SPARK_BUCKETS = 10
+
+
+def parse_spark(output):
+    # Same keys as the JSON engines, buckets as "Bucket 1" to "Bucket 10"
+    results = {}
+    for line in output.decode().splitlines():
+        match = SPARK_BUCKET.match(line)
+        if match:
+            results["Bucket %s" % match.group(1)] = int(match.group(2))
+            continue
+        match = SPARK_LINE.match(line)
+        if match:
+            results[match.group(1) + ": "] = float(match.group(2))
+    return results
+
+
+def reference(path, options):
+    """ Exact results of the JSON engines, plus the buckets of the Spark jobs."""
+    groups, values = numpy_engine.read_values(path, 64 << 20)
+    values = np.sort(values)
+    results = dict(numpy_engine.values_output(values, options))
+    hist = statsutil.histogram_from_array(values, values[0], values[-1], SPARK_BUCKETS)
+    for i, count in enumerate(statsutil.closed_histogram(hist)):
+        results["Bucket %d" % (i + 1)] = count
+    return values, results
+
+
+def excluded_keys(output_format, expected):
+    """ Keys of the reference that an output format does not have."""
+    if output_format == 'json':
+        return [key for key in expected if key.startswith("Bucket ")]
+    produced = set(key + ": " for key in SPARK_KEYS)
+    produced.update("Bucket %d" % (i + 1) for i in range(SPARK_BUCKETS))
+    return [key for key in expected if key not in produced]
+
+
+def check(name, results, expected, sorted_values, args):
+    """ Return a list of mismatches for the keys of expected,
+        a key missing from results is one too."""
+    quantiles = dict(("Percentile %g: " % float(p), float(p) / 100.0) for p in args.percentiles.split(',') if p)
+    quantiles["Median: "] = 0.5
+    abs_tol = 5e-7 if name.startswith('spark') else 0.0
+    errors = []
+    for key in sorted(expected):
+        if key not in results:
+            errors.append("%smissing" % key)
+            continue
+        got, want = results[key], expected[key]
+        if key in quantiles:
+            # Rank of the reported value, counting ties as favourably as possible
+            n = len(sorted_values)
+            low = np.searchsorted(sorted_values, got - abs_tol, 'left') / float(n)
+            high = np.searchsorted(sorted_values, got + abs_tol, 'right') / float(n)
+            q = quantiles[key]
+            error = 0.0 if low <= q <= high else min(abs(low - q), abs(high - q))
+            if error > args.rank_error:
+                errors.append("%s%r has rank error %1.4f" % (key, got, error))
+        elif isinstance(want, int):
+            if got != want:
+                errors.append("%s%r, expected %r" % (key, got, want))
+        elif not math.isclose(got, want, rel_tol=1e-9, abs_tol=abs_tol):
+            errors.append("%s%r, expected %r" % (key, got, want))
+    return errors
+
+
+def run(command):
+    start = time.time()
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return time.time() - start, result
+
+
+def spark_available():
+    try:
+        import pyspark
+    except ImportError:
+        return False
+    return True
+
+
+def compare(args):
+    sorted_values, expected = reference(args.file, args)
+    size = os.path.getsize(args.file)
+    names = args.engines.split(',') if args.engines else [name for name, _, _ in ENGINES]
+    failed = False
+    print("Engine\t\tTime [s]\tMB/s\tChecked\tMismatches")
+    for name, command, output_format in ENGINES:
+        if name not in names:
+            continue
+        if output_format == 'spark' and not spark_available():
+            sys.stderr.write("Skipping %s, pyspark is not installed\n" % name)
+            continue
+        runs = [run(command(args.file, args)) for i in range(args.repeat)]
+        best = min(t for t, result in runs)
+        result = runs[0][1]
+        if result.returncode != 0:
+            sys.stderr.write("%s failed:\n%s\n" % (name, result.stderr.decode()))
+            failed = True
+            continue
+        results = (parse_json if output_format == 'json' else parse_spark)(result.stdout)
+        excluded = excluded_keys(output_format, expected)
+        checked = dict((key, value) for key, value in expected.items() if key not in excluded)
+        errors = check(name, results, checked, sorted_values, args)
+        failed = failed or bool(errors)
+        print("%-14s\t%1.3f\t\t%1.1f\t%d\t%d" % (name, best, size / 1e6 / best,
+                                                 len(checked), len(errors)))
+        sys.stderr.write("%s: excluded, not in its output: %s\n"
+                         % (name, ', '.join(key.rstrip(': ') for key in excluded)))
+        for error in errors:
+            sys.stderr.write("%s: %s\n" % (name, error))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Check that all engines agree and compare their throughput',
+        epilog = 'Example: compare_engines.py --file testdata.dat --engines numpy,local,mrjob\\ 1a'
+    )
+    parser.add_argument('--file', '-f',
+                        default='testdata.dat',
+                        type = str,
+                        help='File to process')
+    parser.add_argument('--engines', '-e',
+                        default=None,
+                        type = str,
+                        help='Comma separated engines to run, all by default: %s'
+                             % ', '.join(name for name, _, _ in ENGINES))
+    parser.add_argument('--repeat',
+                        default=1,
+                        type = int,
+                        help='Number of runs, the fastest one is reported')
+    parser.add_argument('--rank-error',
+                        default=0.02,
+                        type = float,
+                        help='Largest rank error allowed for sketched quantiles')
+    statsutil.add_summary_args(parser.add_argument)
+    args = parser.parse_args()
+    args.mean = None
+    sys.exit(compare(args))
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+import argparse
+import io
+import multiprocessing as mp
+import sys
+import time
+import numpy as np
+import blockzip
+
+# Generates large inputs in the testdata.dat format: id, group and value
+# per line, written as "%d %-7d %f" like the original file.
+#
+# Rows are produced in blocks. Every block gets its own random stream
+# derived from --seed and the block number, so the output only depends on
+# the seed and the block size, not on the number of workers.
+
+LINE_FORMAT = b"%d %-7d %f\n"
+
+
+def draw_values(rng, n, args):
+    if args.distribution == 'uniform':
+        values = args.loc + args.scale * rng.random(n)
+    elif args.distribution == 'normal':
+        values = rng.normal(args.loc, args.scale, n)
+    elif args.distribution == 'exponential':
+        values = args.loc + rng.exponential(args.scale, n)
+    else:
+        values = args.loc + rng.lognormal(0.0, args.scale, n)
+
+    # Outliers are spread uniformly over --outlier-scale times the scale on both sides
+    outliers = rng.random(n) < args.outliers
+    nr_outliers = int(outliers.sum())
+    if nr_outliers:
+        spread = args.outlier_scale * args.scale
+        values[outliers] = args.loc + rng.uniform(-spread, spread, nr_outliers)
+    return values
+
+
+def group_probabilities(args):
+    # Zipf like popularity, group g gets a share proportional to 1 / (g + 1)**skew
+    weights = 1.0 / np.arange(1, args.groups + 1) ** args.skew
+    return weights / weights.sum()
+
+
+def generate_block(task):
+    block, rows, args = task
+    rng = np.random.default_rng(np.random.SeedSequence([args.seed, block]))
+    ids = rng.integers(1000000, 10000000, rows)
+    groups = rng.choice(args.groups, size=rows, p=group_probabilities(args))
+    values = draw_values(rng, rows, args)
+
+    text = io.BytesIO()
+    for i, g, v in zip(ids.tolist(), groups.tolist(), values.tolist()):
+        text.write(LINE_FORMAT % (i, g, v))
+    data = text.getvalue()
+    raw_size = len(data)
+    # Every block is compressed on its own and indexed, see blockzip.py
+    if args.compress != 'none':
+        data = blockzip.compress(data, args.compress, args.level)
+    return block, data, rows, raw_size
+
+
+def output_name(args, shard):
+    name = args.output
+    if args.shards > 1:
+        name = "%s.%05d" % (name, shard)
+    if args.compress == 'gzip' and not name.endswith('.gz'):
+        name += '.gz'
+    elif args.compress == 'zstd' and not name.endswith('.zst'):
+        name += '.zst'
+    return name
+
+
+def close_output(out, args, index):
+    out.close()
+    if args.compress != 'none':
+        blockzip.write_index(out.name, args.compress, index)
+
+
+def generate(args):
+    start = time.time()
+    nr_blocks = (args.rows + args.block_rows - 1) // args.block_rows
+    tasks = [(block, min(args.block_rows, args.rows - block * args.block_rows), args)
+             for block in range(nr_blocks)]
+
+    out = None
+    shard = -1
+    nr_files = 0
+    written = 0
+    index = []
+    with mp.Pool(args.workers) as pool:
+        # imap keeps the blocks in order while the workers run ahead
+        for block, data, rows, raw_size in pool.imap(generate_block, tasks):
+            block_shard = block * args.shards // nr_blocks
+            if block_shard != shard:
+                if out is not None:
+                    close_output(out, args, index)
+                shard = block_shard
+                out = open(output_name(args, shard), 'wb')
+                nr_files += 1
+                index = []
+            index.append((out.tell(), len(data), rows, raw_size))
+            out.write(data)
+            written += len(data)
+    if out is not None:
+        close_output(out, args, index)
+
+    total_time = time.time() - start
+    # Every file holds whole blocks, so there are no more files than blocks
+    sys.stderr.write("Wrote %d rows (%1.1f MB) in %d file(s) in %1.2f s\n"
+                     % (args.rows, written / 1e6, nr_files, total_time))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Generate data files in the testdata.dat format',
+        epilog = 'Example: generate_data.py --rows 10000000 --output big.dat --skew 1.2 --workers 8'
+    )
+    parser.add_argument('--rows', '-n',
+                        default=1000000,
+                        type = int,
+                        help='Number of rows to generate')
+    parser.add_argument('--output', '-o',
+                        required=True,
+                        type = str,
+                        help='File to write, numbered when sharded')
+    parser.add_argument('--groups', '-g',
+                        default=17,
+                        type = int,
+                        help='Number of groups')
+    parser.add_argument('--skew',
+                        default=0.0,
+                        type = float,
+                        help='Zipf exponent of the group sizes, 0 gives equally large groups')
+    parser.add_argument('--distribution', '-d',
+                        default='uniform',
+                        choices=['uniform', 'normal', 'exponential', 'lognormal'],
+                        help='Distribution of the values')
+    parser.add_argument('--loc',
+                        default=3.14,
+                        type = float,
+                        help='Location of the values: lower bound for uniform, mean for normal, '
+                             'shift for exponential and lognormal')
+    parser.add_argument('--scale',
+                        default=4.0,
+                        type = float,
+                        help='Scale of the values: width for uniform, standard deviation for '
+                             'normal, mean for exponential, sigma for lognormal')
+    parser.add_argument('--outliers',
+                        default=0.0,
+                        type = float,
+                        help='Fraction of values replaced by outliers')
+    parser.add_argument('--outlier-scale',
+                        default=10.0,
+                        type = float,
+                        help='Outliers lie within this many times the scale around the location')
+    parser.add_argument('--seed', '-s',
+                        default=2122,
+                        type = int,
+                        help='Seed, the same seed and block size give the same file')
+    parser.add_argument('--block-rows',
+                        default=1 << 20,
+                        type = int,
+                        help='Rows generated per task')
+    parser.add_argument('--workers', '-w',
+                        default=mp.cpu_count(),
+                        type = int,
+                        help='Number of parallel processes')
+    parser.add_argument('--shards',
+                        default=1,
+                        type = int,
+                        help='Number of files to split the output into, at most one per block')
+    parser.add_argument('--compress',
+                        default='none',
+                        choices=['none'] + blockzip.CODECS,
+                        help='Compress the output in independent blocks, indexed so they can be '
+                             'read in parallel (see blockzip.py)')
+    parser.add_argument('--level',
+                        default=6,
+                        type = int,
+                        help='Compression level')
+    args = parser.parse_args()
+    generate(args)
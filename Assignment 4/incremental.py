@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+import statsutil
+import local_engine
+
+# Incremental statistics for files that only grow by appending.
+# The merged summaries are kept in a state file together with the byte offset
+# they cover. A later run only scans the bytes after that offset and merges
+# them in. If the already processed part of the file changed, which is
+# detected by checksums of its head and of the bytes just before the offset,
+# or the summary options changed, everything is recomputed.
+#
+# The mean deviation needs the final mean and can not be updated this way,
+# so it is estimated from the quantile sketch instead of read exactly and
+# reported as "Mean deviation (sketch)".
+
+# Bytes hashed at the start of the file and just before the offset
+CHECK_BYTES = 1 << 20
+# Options that change what the summaries hold
+STATE_OPTIONS = ('group', 'all_groups', 'bins', 'hist_min', 'hist_max', 'sketch_k')
+
+
+def checksum(path, offset):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        sha.update(f.read(min(offset, CHECK_BYTES)))
+        f.seek(max(0, offset - CHECK_BYTES))
+        sha.update(f.read(offset - f.tell()))
+    return sha.hexdigest()
+
+
+def complete_size(path):
+    """ Size of the file up to and including its last newline, a line that
+        is still being written is left for the next run."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        pos = size
+        while pos > 0:
+            step = min(pos, 1 << 16)
+            f.seek(pos - step)
+            end = f.read(step).rfind(b'\n')
+            if end != -1:
+                return pos - step + end + 1
+            pos -= step
+    return 0
+
+
+def load_state(args):
+    """ Return the saved offset and summaries, or (0, None) when the
+        state is missing or no longer matches the file."""
+    if not os.path.exists(args.state):
+        return 0, None
+    with open(args.state) as f:
+        state = json.load(f)
+    options = dict((name, getattr(args, name)) for name in STATE_OPTIONS)
+    offset = state["offset"]
+    if state["options"] != options:
+        sys.stderr.write("Summary options changed, recomputing everything\n")
+        return 0, None
+    if os.path.getsize(args.file) < offset or checksum(args.file, offset) != state["checksum"]:
+        sys.stderr.write("Processed part of %s changed, recomputing everything\n" % args.file)
+        return 0, None
+    merged = state["summary"]
+    if args.all_groups:
+        merged = dict((int(group), summary) for group, summary in merged.items())
+    return offset, merged
+
+
+def save_state(args, offset, merged):
+    state = {
+        "file": os.path.abspath(args.file),
+        "offset": offset,
+        "checksum": checksum(args.file, offset),
+        "options": dict((name, getattr(args, name)) for name in STATE_OPTIONS),
+        "summary": merged,
+    }
+    # Write to a temporary file first so an interrupted run keeps the old state
+    with open(args.state + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(args.state + '.tmp', args.state)
+
+
+def compute_stats(args):
+    start = time.time()
+    offset, merged = load_state(args)
+    size = complete_size(args.file)
+    chunks = local_engine.split_file(args.file, max(1, int(args.chunk_size * (1 << 20))), offset, size)
+    with mp.Pool(args.workers) as pool:
+        results = pool.imap_unordered(local_engine.scan_chunk, [(chunk, args) for chunk in chunks])
+        if merged is not None:
+            results = [(0, merged)] + list(results)
+        lines, merged = local_engine.merge_results(results, args)
+    if merged is None:
+        return
+    save_state(args, size, merged)
+    total_time = time.time() - start
+
+    if args.all_groups:
+        for group in sorted(merged):
+            local_engine.write_output(((group, label), value) for label, value
+                                      in statsutil.summary_output(merged[group], args, sketch_mean_dev=True))
+    else:
+        local_engine.write_output(statsutil.summary_output(merged, args, sketch_mean_dev=True))
+
+    sys.stderr.write("Read %d new lines (%1.1f MB from offset %d) in %1.3f s\n"
+                     % (lines, (size - offset) / 1e6, offset, total_time))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Produce stats from a growing data file, reading only what was appended',
+        epilog = 'Example: incremental.py --file testdata.dat --state testdata.state'
+    )
+    parser.add_argument('--file', '-f',
+                        required=True,
+                        type = str,
+                        help='File to process')
+    parser.add_argument('--state', '-s',
+                        type = str,
+                        help='State file, defaults to the data file with .state appended')
+    parser.add_argument('--workers', '-w',
+                        default=mp.cpu_count(),
+                        type = int,
+                        help='Number of parallel processes')
+    parser.add_argument('--chunk-size',
+                        default=16,
+                        type = float,
+                        help='Size of the byte ranges handed to the workers in MB')
+    parser.add_argument('--group', '-g',
+                        default=-1,
+                        type=int,
+                        help='Specify group number to run statistics for')
+    parser.add_argument('--all-groups', '-a',
+                        action='store_true',
+                        help='Run statistics for every group')
+    statsutil.add_summary_args(parser.add_argument)
+    args = parser.parse_args()
+    args.mean = None
+    if args.state is None:
+        args.state = args.file + '.state'
+    compute_stats(args)
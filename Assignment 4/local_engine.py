@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+import argparse
+import json
+import mmap
+import multiprocessing as mp
+import os
+import sys
+import time
+import numpy as np
+import statsutil
+import columnar
+import blockzip
+
+# Single host engine for the statistics jobs. The input file is split into
+# byte ranges, every worker in a process pool scans its ranges through mmap
+# and the per-range summaries are merged, the same way the MRJob combiners
+# and reducers merge them. The output matches problem1a.py, or problem1d.py
+# with --group or --all-groups.
+
+def split_file(path, chunk_size, offset=0, size=None):
+    """ Byte ranges covering [offset, size) of the file, offset and size
+        have to be at line boundaries."""
+    if size is None:
+        size = os.path.getsize(path)
+    return [(path, start, min(start + chunk_size, size)) for start in range(offset, size, chunk_size)]
+
+
+def split_input(path, chunk_size):
+    """ Chunks of a text file, or the blocks of a block compressed file."""
+    if blockzip.is_blockzip(path):
+        return [blockzip.Block(path, block) for block in range(len(blockzip.read_index(path)[1]))]
+    return split_file(path, chunk_size)
+
+
+def read_chunk(path, start, end):
+    """ Return the bytes of all lines that start in [start, end),
+        so every line belongs to exactly one chunk."""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            # Skip the line the previous chunk is reading to the end of
+            if start > 0 and mm[start - 1:start] != b'\n':
+                start = mm.find(b'\n', start)
+                start = size if start == -1 else start + 1
+            stop = size if end >= size else mm.find(b'\n', end - 1)
+            stop = size if stop == -1 else stop + 1
+            if start >= stop:
+                return b''
+            return mm[start:stop]
+
+
+def chunk_values(chunk, options):
+    """ Group and value arrays of a chunk, filtered by --group."""
+    if isinstance(chunk, blockzip.Block):
+        data = blockzip.read_block(*chunk)
+    else:
+        data = read_chunk(*chunk)
+    ids, groups, values = columnar.parse_text(data)
+    if options.group != -1:
+        keep = groups == options.group
+        groups, values = groups[keep], values[keep]
+    return groups, values
+
+
+def scan_chunk(task):
+    chunk, options = task
+    groups, values = chunk_values(chunk, options)
+    if not options.all_groups:
+        return len(values), statsutil.summary_from_array(values, options)
+    summaries = {}
+    for group in np.unique(groups).tolist():
+        summaries[group] = statsutil.summary_from_array(values[groups == group], options)
+    return len(values), summaries
+
+
+def deviation_chunk(task):
+    """ Sum of |x - mean| of a chunk, per group with --all-groups."""
+    chunk, options, means = task
+    groups, values = chunk_values(chunk, options)
+    if not options.all_groups:
+        return float(np.abs(values - means).sum())
+    return dict((group, float(np.abs(values[groups == group] - means[group]).sum()))
+                for group in np.unique(groups).tolist())
+
+
+def merge_results(results, options):
+    lines = 0
+    merged = None
+    for nr_lines, result in results:
+        lines += nr_lines
+        if not options.all_groups:
+            merged = result if merged is None else statsutil.merge_summaries(merged, result)
+            continue
+        if merged is None:
+            merged = {}
+        for group, summary in result.items():
+            if group in merged:
+                statsutil.merge_summaries(merged[group], summary)
+            else:
+                merged[group] = summary
+    return lines, merged
+
+
+def run_pass(pool, chunks, options):
+    tasks = [(chunk, options) for chunk in chunks]
+    return merge_results(pool.imap_unordered(scan_chunk, tasks), options)
+
+
+def add_deviations(pool, chunks, options, merged):
+    """ Second pass, only sums |x - mean| into the summaries of pass one."""
+    if options.all_groups:
+        means = dict((group, summary[0][1]) for group, summary in merged.items())
+    else:
+        means = merged[0][1]
+    tasks = [(chunk, options, means) for chunk in chunks]
+    for result in pool.imap_unordered(deviation_chunk, tasks):
+        if not options.all_groups:
+            merged[3] += result
+            continue
+        for group, total in result.items():
+            merged[group][3] += total
+
+
+def write_output(output):
+    # Same format as the JSON protocol of the MRJob jobs
+    for key, value in output:
+        sys.stdout.write("%s\t%s\n" % (json.dumps(key), json.dumps(value)))
+
+
+def compute_stats(args):
+    start = time.time()
+    chunks = split_input(args.file, max(1, int(args.chunk_size * (1 << 20))))
+    with mp.Pool(args.workers) as pool:
+        # Pass one gets the summaries with the means, pass two only sums up |x - mean|
+        lines, merged = run_pass(pool, chunks, args)
+        if not lines:
+            return
+        add_deviations(pool, chunks, args, merged)
+    total_time = time.time() - start
+
+    if args.all_groups:
+        for group in sorted(merged):
+            write_output(((group, label), value)
+                         for label, value in statsutil.summary_output(merged[group], args, True))
+    else:
+        write_output(statsutil.summary_output(merged, args, True))
+
+    size = os.path.getsize(args.file)
+    sys.stderr.write("Processed %d lines (%1.1f MB) in %1.3f s, %1.1f MB/s over both passes\n"
+                     % (lines, size / 1e6, total_time, 2 * size / 1e6 / total_time))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Produce stats from data with a local process pool',
+        epilog = 'Example: local_engine.py --file testdata.dat --workers 4 --all-groups'
+    )
+    parser.add_argument('--file', '-f',
+                        required=True,
+                        type = str,
+                        help='File to process, text or block compressed')
+    parser.add_argument('--workers', '-w',
+                        default=mp.cpu_count(),
+                        type = int,
+                        help='Number of parallel processes')
+    parser.add_argument('--chunk-size',
+                        default=16,
+                        type = float,
+                        help='Size of the byte ranges handed to the workers in MB')
+    parser.add_argument('--group', '-g',
+                        default=-1,
+                        type=int,
+                        help='Specify group number to run statistics for')
+    parser.add_argument('--all-groups', '-a',
+                        action='store_true',
+                        help='Run statistics for every group')
+    statsutil.add_summary_args(parser.add_argument)
+    args = parser.parse_args()
+    args.mean = None
+    compute_stats(args)
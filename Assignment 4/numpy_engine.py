@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import statsutil
+import columnar
+import local_engine
+
+# Single process engine that keeps every value in one NumPy array. It
+# computes the same summaries as the other engines with the same statsutil
+# functions, but the mean deviation needs no second pass and the quantiles
+# are exact. Serves as the reference for compare_engines.py.
+
+# Options for local_engine.chunk_values, groups are filtered later
+NO_GROUP = argparse.Namespace(group=-1)
+
+
+def read_values(path, chunk_size):
+    """ Group and value arrays of a text, columnar or block compressed file,
+        parsed a chunk at a time so the text is never held in memory all at once."""
+    if columnar.is_columnar(path):
+        blocks = [columnar.read_block(path, block) for block in range(columnar.read_header(path)[1])]
+        return (np.concatenate([groups for ids, groups, values in blocks]),
+                np.concatenate([values for ids, groups, values in blocks]))
+    groups, values = [], []
+    for chunk in local_engine.split_input(path, chunk_size):
+        chunk_groups, chunk_values = local_engine.chunk_values(chunk, NO_GROUP)
+        groups.append(chunk_groups)
+        values.append(chunk_values)
+    return np.concatenate(groups), np.concatenate(values)
+
+
+def values_output(values, options):
+    values = np.sort(values)
+    summary = statsutil.summary_from_array(values, options, float(values.mean()))
+    return statsutil.summary_output(summary, options, True, values)
+
+
+def compute_stats(args):
+    start = time.time()
+    groups, values = read_values(args.file, max(1, int(args.chunk_size * (1 << 20))))
+    if args.group != -1:
+        keep = groups == args.group
+        groups, values = groups[keep], values[keep]
+    if not len(values):
+        return
+
+    if args.all_groups:
+        for group in np.unique(groups).tolist():
+            local_engine.write_output(((group, label), value)
+                                      for label, value in values_output(values[groups == group], args))
+    else:
+        local_engine.write_output(values_output(values, args))
+    total_time = time.time() - start
+
+    size = os.path.getsize(args.file)
+    sys.stderr.write("Processed %d lines (%1.1f MB) in %1.3f s, %1.1f MB/s\n"
+                     % (len(values), size / 1e6, total_time, size / 1e6 / total_time))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Produce stats from data in a single process with NumPy',
+        epilog = 'Example: numpy_engine.py --file testdata.dat --group 3'
+    )
+    parser.add_argument('--file', '-f',
+                        required=True,
+                        type = str,
+                        help='File to process, text, columnar or block compressed')
+    parser.add_argument('--chunk-size',
+                        default=64,
+                        type = float,
+                        help='Size of the text chunks parsed at a time in MB')
+    parser.add_argument('--group', '-g',
+                        default=-1,
+                        type=int,
+                        help='Specify group number to run statistics for')
+    parser.add_argument('--all-groups', '-a',
+                        action='store_true',
+                        help='Run statistics for every group')
+    statsutil.add_summary_args(parser.add_argument)
+    args = parser.parse_args()
+    args.mean = None
+    compute_stats(args)
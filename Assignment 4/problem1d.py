@@ -1,9 +1,16 @@
-from mrjob.job import MRJob, MRStep
+from mrjob.job import MRJob
 import sys
-import time
-import math
+import atexit
+import json
+import os
+import random
+import tempfile
+import numpy as np
+import statsutil
 
-class Problem1a(MRJob):
+class Problem1a(statsutil.SummarySteps, statsutil.MeanDeviationSteps, MRJob):
+
+    FILES = ['statsutil.py', 'columnar.py', 'blockzip.py']
 
     def configure_args(self):
         super(Problem1a, self).configure_args()
@@ -12,123 +19,113 @@ class Problem1a(MRJob):
                              type=int,
                              required=False,
                              help='Specify group number to run statistics for')
-
-
-    def mean_std_dev(self, value, mean):
-        mean_dev = abs(value - mean)
-        std_dev = (value - mean)**2
-        return mean_dev, std_dev
-
-    def mapper_init(self):
-        self.group_choice = self.options.group
-
-    def mapper(self, _, line):
+        self.add_passthru_arg('--all-groups', '-a',
+                             action='store_true',
+                             help='Run statistics for every group in a single job')
+        self.add_passthru_arg('--group-shards',
+                             default=4,
+                             type=int,
+                             help='With --all-groups, number of reducers sharing the partial '
+                                  'aggregation of each group, so one large group does not '
+                                  'end up on a single reducer')
+        self.add_file_arg('--group-means',
+                          help='JSON file with the mean of every group, enables the mean '
+                               'deviation with --all-groups. Set automatically when running '
+                               'from the command line')
+        statsutil.configure_stats_args(self)
+
+    def steps(self):
+        if statsutil.has_mean(self.options):
+            # Second run of statsutil.run_with_mean, only sums |x - mean| per group
+            return [self.mean_dev_step()]
+        if not self.options.all_groups:
+            return [self.summary_step()]
+        # Step one merges per (group, shard) and step two merges the
+        # few partial summaries of each group into the final result.
+        return [self.task_step(mapper_init=self.groups_mapper_init,
+                               mapper=self.groups_mapper,
+                               mapper_final=self.groups_mapper_final,
+                               combiner=self.combiner,
+                               reducer=self.groups_shard_reducer),
+                self.task_step(reducer=self.groups_reducer)]
+
+    def summary_group(self):
+        # The default group -1 processes all data
+        return None if self.options.group == -1 else self.options.group
+
+    def groups_mapper_init(self):
+        # Every mapper sends all its records for a group to the same shard,
+        # different mappers spread a large group over --group-shards reducers.
+        self.shard = random.randrange(self.options.group_shards)
+        self.summaries = {}
+        statsutil.task_start(self, 'mapper')
+
+    def groups_mapper(self, _, line):
+        if self.options.input_format != 'text':
+            ids, groups, values = statsutil.read_block_ref(self, line)
+            for group in np.unique(groups).tolist():
+                self.add_group_summary(group, statsutil.summary_from_array(values[groups == group], self.options))
+            return
+        statsutil.count_input(self, 1, len(line.encode()) + 1)
         splitline = line.split()
         group = int(splitline[1])
         value = float(splitline[2])
-        #If group is the default value, process all data
-        if self.group_choice == -1:
-            yield ("lineinfo", value)
-        #Else we only process the data that belongs to the specified group
-        elif self.group_choice == group:
-            yield ("lineinfo", value)
-
-        
-    def combiner(self, key, counts):
-        minimum = sys.float_info.max
-        maximum = -sys.float_info.max
-        partial_sum = 0
-        bins = [0] * 10
-        values = []
-        for i, c in enumerate(counts):
-            values.append(c)
-            partial_sum += c
-            if c < minimum:
-                minimum = c
-            if c > maximum:
-                maximum = c
-            bindex = int(c)
-            bins[bindex] += 1
-        nr_lines = i +1
-        yield ("stats", (nr_lines, partial_sum, values))
-        yield ("bins", bins)
-        yield ("minimum", minimum)
-        yield ("maximum", maximum)
-
-
-    
-
-    def reducer(self, key, counts):
-        if key == "stats":
-            total_lines = 0
-            total_sum = 0
-            final_max = 0
-            all_values = []
-
-            for c in counts:
-                total_lines += c[0]
-                total_sum += c[1]
-                all_values += c[2]
-
-            mean = float(total_sum)/total_lines
-
-
-            # I would like to avoid having to pass all values to the reducer and looping through them here
-            # But I was unable to find a good solution
-
-            dev_list = [self.mean_std_dev(value, mean) for value in all_values]
-
-            # I tried another approach where I had an additional step of map/combine/reduce.
-            # The new mapper would calculate a deviation on a single value with the mean from the first reducer
-            # The combiner would do the partial sums for the std and mean deviations
-            # The final second reducer would summarize and calculate the final mean and std deviations
-            # The min/max/bins values would just be passed through.
-            # The problem I had with this was that I didnt know how to call the mapper with the initial data and the mean
-            # without sending 1 yield per line from the reducer, which meant I had to loop through the data anyway
-            
-            # I experimented a bit with single pass algorithms for standard dev and mean dev and while 
-            # I got that working for standard dev, I could not find any good algo for mean dev which meant I had to
-            # do an additional pass over the data anyway.
-
-
-            mean_devs, std_devs = zip(*dev_list)
-            stand_dev = math.sqrt(sum(std_devs)/total_lines)
-            mean_deviation = sum(mean_devs)/total_lines
-
-            yield("Standard deviation: ", stand_dev)
-            yield("Mean deviation: ", mean_deviation)
-
-        if key == "bins":
-            final_bins = [0] * 10
-            
-            for c in counts:
-                for i, b in enumerate(c):
-                    final_bins[i] += b
-            yield ("X < 1", final_bins[0])
-            yield ("1 <= X < 2", final_bins[1])
-            yield ("2 <= X < 3", final_bins[2])
-            yield ("3 <= X < 4", final_bins[3])
-            yield ("4 <= X < 5", final_bins[4])
-            yield ("5 <= X < 6", final_bins[5])
-            yield ("6 <= X < 7", final_bins[6])
-            yield ("7 <= X < 8", final_bins[7])
-            yield ("8 <= X < 9", final_bins[8])
-            yield ("9 <= X", final_bins[9])
-        
-        if key == "minimum":
-            final_min = sys.float_info.max
-            for c in counts:
-                if c < final_min:
-                    final_min = c
-            yield ("Minimum: ", final_min)
-        
-        if key == "maximum":
-            final_max = -sys.float_info.max
-            for c in counts: 
-                if c > final_max:
-                    final_max = c
-            yield ("Maximum: ", final_max)
-
-            
+        if group not in self.summaries:
+            self.summaries[group] = statsutil.new_summary(self.options)
+        statsutil.summary_add(self.summaries[group], value, self.options)
+
+    def add_group_summary(self, group, summary):
+        if group not in self.summaries:
+            self.summaries[group] = summary
+        else:
+            statsutil.merge_summaries(self.summaries[group], summary)
+
+    def groups_mapper_final(self):
+        output = [((group, self.shard), summary) for group, summary in self.summaries.items()]
+        return statsutil.task_done(self, output)
+
+    def groups_shard_reducer(self, key, counts):
+        summary = self.merge_stats(key, counts)
+        return statsutil.task_output(self, [(key[0], summary)])
+
+    def groups_reducer(self, group, counts):
+        summary = self.merge_stats(group, counts)
+        output = [((group, label), value)
+                  for label, value in statsutil.summary_output(summary, self.options)]
+        return statsutil.task_output(self, output, self.output_protocol())
+
+    @property
+    def grouped_deviations(self):
+        return self.options.all_groups or self.options.group != -1
+
+    def deviation_mean(self, group):
+        if self.options.all_groups:
+            mean = self.options.mean if self.group_means is None else self.group_means[group]
+            return ((group, "Mean deviation: "), mean)
+        if self.options.group in (-1, group):
+            return ("Mean deviation: ", self.options.mean)
+        return None
+
+    def mean_dev_mapper_init(self):
+        super(Problem1a, self).mean_dev_mapper_init()
+        self.group_means = None
+        if self.options.group_means is not None:
+            with open(self.options.group_means) as f:
+                self.group_means = dict((int(g), m) for g, m in json.load(f).items())
+
+
+def group_mean_args(output):
+    """ Like statsutil.mean_args, but writes the mean of every group
+        to a file for --group-means when running with --all-groups."""
+    if not output or not isinstance(output[0][0], list):
+        return statsutil.mean_args(output)
+    means = dict((key[0], value) for key, value in output if key[1] == "Mean: ")
+    fd, path = tempfile.mkstemp(prefix='group-means', suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(means, f)
+    atexit.register(os.remove, path)
+    return ['--group-means', path]
+
+
 if __name__ == '__main__':
-    Problem1a.run()
\ No newline at end of file
+    statsutil.run_with_mean(Problem1a, sys.argv[1:], group_mean_args)
@@ -0,0 +1,678 @@
+import sys
+import json
+import math
+import time
+import random
+import re
+import numpy as np
+import columnar
+import blockzip
+
+# Helpers shared by the MRJob statistics jobs in this directory.
+# The jobs list this file in FILES so it is shipped along with them.
+
+# Moments are kept as a fixed size list so they serialize cheaply:
+# [count, mean, M2, minimum, maximum]
+# where M2 is the sum of squared differences from the mean.
+
+# NaN has no place in the order or the moments of the values, so every
+# engine rejects it the same way instead of counting or dropping it.
+NAN_ERROR = "NaN in the input values, the statistics are not defined for it"
+
+
+def moments(value):
+    if value != value:
+        raise ValueError(NAN_ERROR)
+    return [1, value, 0.0, value, value]
+
+
+def merge_moments(a, b):
+    # Parallel variance update, see Chan, Golub and LeVeque (1979).
+    # Merging two summaries gives the same result as summarizing the
+    # union of their values, so this works in combiners and reducers alike.
+    n_a, mean_a, m2_a, min_a, max_a = a
+    n_b, mean_b, m2_b, min_b, max_b = b
+    if n_a == 0:
+        return list(b)
+    if n_b == 0:
+        return list(a)
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta * delta * n_a * n_b / n
+    return [n, mean, m2, min(min_a, min_b), max(max_a, max_b)]
+
+
+def moments_from_array(values):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return [0, 0.0, 0.0, 0.0, 0.0]
+    mean = float(values.mean())
+    # A mean of NaN is rare without NaN values, so only then look for them
+    if math.isnan(mean) and np.isnan(values).any():
+        raise ValueError(NAN_ERROR)
+    return [len(values), mean, float(((values - mean) ** 2).sum()),
+            float(values.min()), float(values.max())]
+
+
+def std_dev(m):
+    return math.sqrt(m[2] / m[0])
+
+
+# Histograms have equal width bins over [lo, hi) plus one bin on each side
+# for values outside of the range, so any value can be counted:
+# [below lo, bin 1, ..., bin n, hi and above]
+
+def new_histogram(nr_bins):
+    return [0] * (nr_bins + 2)
+
+
+def histogram_add(hist, value, lo, hi):
+    nr_bins = len(hist) - 2
+    if value < lo:
+        hist[0] += 1
+    elif value >= hi:
+        hist[-1] += 1
+    elif value != value:
+        raise ValueError(NAN_ERROR)
+    else:
+        # min() guards against rounding putting values just below hi in bin n+1
+        hist[min(int((value - lo) / (hi - lo) * nr_bins), nr_bins - 1) + 1] += 1
+
+
+def histogram_from_array(values, lo, hi, nr_bins):
+    """ Same counts as calling histogram_add for every value. All engines
+        bucket values with one of these two functions so they agree."""
+    values = np.asarray(values, dtype=np.float64)
+    inside = values[(values >= lo) & (values < hi)]
+    bins = np.minimum(((inside - lo) / (hi - lo) * nr_bins).astype(np.int64), nr_bins - 1)
+    below = int((values < lo).sum())
+    above = int((values >= hi).sum())
+    # NaN is neither below, inside nor above the range
+    if below + len(inside) + above != len(values):
+        raise ValueError(NAN_ERROR)
+    return [below] + np.bincount(bins, minlength=nr_bins).tolist() + [above]
+
+
+def closed_histogram(hist):
+    """ Bins of a histogram over [minimum, maximum] with the last bin
+        closed, as printed by the Spark jobs. Only the maximum itself
+        lands in the bin above the range."""
+    counts = hist[1:-1]
+    counts[-1] += hist[-1]
+    return counts
+
+
+def merge_histograms(a, b):
+    for i, count in enumerate(b):
+        a[i] += count
+    return a
+
+
+def histogram_labels(lo, hi, nr_bins):
+    width = (hi - lo) / nr_bins
+    edges = [lo + i * width for i in range(nr_bins)] + [hi]
+    labels = ["X < %g" % lo]
+    for i in range(nr_bins):
+        labels.append("%g <= X < %g" % (edges[i], edges[i + 1]))
+    labels.append("%g <= X" % hi)
+    return labels
+
+
+# Quantile sketch after Karnin, Lang and Liberty, "Optimal Quantile
+# Approximation in Streams" (KLL). Level h holds items that each stand for
+# 2**h values. When a level is over its capacity it is sorted and every other
+# item is promoted to the next level. Memory is O(k log(n/k)) and the rank
+# error is around 1.65% for k = 200, shrinking in proportion to 1/k.
+# Stored as [k, [level 0, level 1, ...]].
+
+def sketch_rank_error(k):
+    """ Typical rank error of a sketch of size k, see above."""
+    return 3.3 / k
+
+
+def new_sketch(k):
+    return [k, [[]]]
+
+
+def _level_capacity(k, h, nr_levels):
+    return max(2, int(math.ceil(k * (2.0 / 3.0) ** (nr_levels - 1 - h))))
+
+
+def _compress(sketch):
+    k, levels = sketch
+    h = 0
+    while h < len(levels):
+        if len(levels[h]) >= _level_capacity(k, h, len(levels)):
+            items = sorted(levels[h])
+            # An odd item out stays behind at this level
+            keep = [items.pop()] if len(items) % 2 else []
+            if h + 1 == len(levels):
+                levels.append([])
+            levels[h + 1].extend(items[random.randint(0, 1)::2])
+            levels[h] = keep
+        h += 1
+
+
+def sketch_add(sketch, value):
+    sketch[1][0].append(value)
+    if len(sketch[1][0]) >= _level_capacity(sketch[0], 0, len(sketch[1])):
+        _compress(sketch)
+
+
+def merge_sketches(a, b):
+    levels = a[1]
+    for h, items in enumerate(b[1]):
+        if h == len(levels):
+            levels.append([])
+        levels[h].extend(items)
+    _compress(a)
+    return a
+
+
+def sketch_quantiles(sketch, quantiles):
+    weighted = sorted((item, 2 ** h) for h, items in enumerate(sketch[1]) for item in items)
+    total = sum(w for _, w in weighted)
+    results = []
+    for q in quantiles:
+        rank = q * total
+        seen = 0
+        for item, w in weighted:
+            seen += w
+            if seen > rank:
+                break
+        results.append(item)
+    return results
+
+
+def sketch_mean_deviation(sketch, mean):
+    """ Estimate of the mean of |x - mean| from the items in the sketch,
+        for when the values themselves can not be read again."""
+    total = 0
+    deviation = 0.0
+    for h, items in enumerate(sketch[1]):
+        for item in items:
+            total += 2 ** h
+            deviation += 2 ** h * abs(item - mean)
+    return deviation / total
+
+
+# A summary is everything the jobs report, in a form that can be merged:
+# [moments, histogram, quantile sketch, sum of |x - mean|]
+# The last entry is only filled in when the mean is known (--mean).
+
+def add_summary_args(add_argument):
+    """ Add the options controlling the summaries, add_argument is either
+        MRJob.add_passthru_arg or ArgumentParser.add_argument."""
+    add_argument('--bins',
+                 default=10,
+                 type=int,
+                 help='Number of histogram bins between --hist-min and --hist-max')
+    add_argument('--hist-min',
+                 default=0.0,
+                 type=float,
+                 help='Lower edge of the histogram, smaller values are counted separately')
+    add_argument('--hist-max',
+                 default=10.0,
+                 type=float,
+                 help='Upper edge of the histogram, larger values are counted separately')
+    add_argument('--sketch-k',
+                 default=200,
+                 type=int,
+                 help='Size of the quantile sketch, the rank error shrinks as 1/k')
+    add_argument('--percentiles',
+                 default='25,75,90,99',
+                 help='Comma separated percentiles to report besides the median')
+
+
+def configure_stats_args(job):
+    job.add_passthru_arg('--mean',
+                         default=None,
+                         type=float,
+                         required=False,
+                         help='Mean of the data, only the mean deviation is computed when given. '
+                              'Set automatically when running from the command line')
+    job.add_passthru_arg('--input-format',
+                         default='text',
+                         choices=['text', 'columnar', 'blockzip'],
+                         help='text reads testdata.dat style lines, columnar and blockzip read '
+                              'block lists written by "columnar.py manifest" or "blockzip.py manifest" '
+                              'and decode whole blocks')
+    add_summary_args(job.add_passthru_arg)
+    # Only used when running from the command line, so not passed on to the tasks
+    job.arg_parser.add_argument('--report',
+                                default=None,
+                                help='Write the wall time of every run and the wall time, task '
+                                     'times and counters of every step to this file as JSON')
+
+
+def new_summary(options):
+    return [[0, 0.0, 0.0, 0.0, 0.0], new_histogram(options.bins), new_sketch(options.sketch_k), 0.0]
+
+
+def summary_add(summary, value, options, mean=None):
+    # mean defaults to --mean, jobs with one mean per group pass their own
+    if mean is None:
+        mean = options.mean
+    summary[0] = merge_moments(summary[0], moments(value))
+    histogram_add(summary[1], value, options.hist_min, options.hist_max)
+    sketch_add(summary[2], value)
+    if mean is not None:
+        summary[3] += abs(value - mean)
+    return summary
+
+
+def summary_from_array(values, options, mean=None):
+    """ Same as calling summary_add for every value, but vectorized
+        for inputs that are decoded into NumPy arrays."""
+    if mean is None:
+        mean = options.mean
+    values = np.asarray(values, dtype=np.float64)
+    summary = new_summary(options)
+    if len(values) == 0:
+        return summary
+    summary[0] = moments_from_array(values)
+    summary[1] = histogram_from_array(values, options.hist_min, options.hist_max, options.bins)
+
+    # Compacting a sorted level keeps every other item, so compacting it h
+    # times keeps every 2**h-th item. Start at the level where that fits.
+    k = options.sketch_k
+    h = 0
+    while len(values) >> h > k:
+        h += 1
+    step = 2 ** h
+    items = np.sort(values)[random.randrange(step)::step]
+    summary[2] = [k, [[] for i in range(h)] + [items.tolist()]]
+    _compress(summary[2])
+
+    if mean is not None:
+        summary[3] = float(np.abs(values - mean).sum())
+    return summary
+
+
+def merge_summaries(a, b):
+    a[0] = merge_moments(a[0], b[0])
+    merge_histograms(a[1], b[1])
+    merge_sketches(a[2], b[2])
+    a[3] += b[3]
+    return a
+
+
+def exact_quantiles(sorted_values, quantiles):
+    # The item at position q * n of the sorted values, the rank sketch_quantiles estimates
+    n = len(sorted_values)
+    return [float(sorted_values[min(int(q * n), n - 1)]) for q in quantiles]
+
+
+def summary_output(summary, options, mean_known=None, sorted_values=None, sketch_mean_dev=False):
+    """ Output records of a summary. Engines that hold all the values can
+        pass them sorted to report exact quantiles instead of the sketch's.
+        Engines that can not read the values again with the final mean pass
+        sketch_mean_dev to report the sketch's estimate of the mean deviation,
+        labelled as such."""
+    moments, hist, sketch, abs_dev = summary
+    total_lines, mean, _, minimum, maximum = moments
+    if mean_known is None:
+        mean_known = options.mean is not None
+
+    yield ("Standard deviation: ", std_dev(moments))
+    if sketch_mean_dev:
+        yield ("Mean deviation (sketch): ", sketch_mean_deviation(sketch, mean))
+    elif mean_known:
+        yield ("Mean deviation: ", abs_dev / total_lines)
+    yield ("Mean: ", mean)
+
+    percentiles = [float(p) for p in options.percentiles.split(',') if p]
+    quantiles = [0.5] + [p / 100.0 for p in percentiles]
+    if sorted_values is None:
+        quantiles = sketch_quantiles(sketch, quantiles)
+    else:
+        quantiles = exact_quantiles(sorted_values, quantiles)
+    yield ("Median: ", quantiles[0])
+    for p, q in zip(percentiles, quantiles[1:]):
+        yield ("Percentile %g: " % p, q)
+
+    for label, count in zip(histogram_labels(options.hist_min, options.hist_max, options.bins), hist):
+        yield (label, count)
+
+    yield ("Minimum: ", minimum)
+    yield ("Maximum: ", maximum)
+
+
+# Instrumentation. Every task counts the records and bytes it reads and
+# writes and its wall time under the counter group of its stage ("mapper",
+# "combiner" or "reducer"). Its own wall time, start and end also go under
+# "task N ..." counters, N being the task's partition, so the report can
+# show the wall time of every step and the skew between tasks.
+# Tasks keep their own tallies and increment the counters once in their
+# _final method, since every increment is written to stderr.
+
+TASK_COUNTER = re.compile(r'task (\d+) (time us|start ms|end ms)$')
+
+
+def task_start(job, stage):
+    job.task_stage = stage
+    job.task_time = time.time()
+    job.task_records = 0
+    job.task_bytes = 0
+    job.task_output_records = 0
+    job.task_output_bytes = 0
+
+
+def count_input(job, records, nr_bytes):
+    job.task_records += records
+    job.task_bytes += nr_bytes
+
+
+def read_block_ref(job, line):
+    """ Id, group and value arrays of the block a line of a columnar or
+        blockzip manifest refers to, counted as input of the task."""
+    if job.options.input_format == 'columnar':
+        ids, groups, values = columnar.read_block_ref(line)
+        count_input(job, len(values), len(values) * columnar.ROW_BYTES)
+    else:
+        data = blockzip.read_block_ref(line)
+        ids, groups, values = columnar.parse_text(data)
+        count_input(job, len(values), len(data))
+    return ids, groups, values
+
+
+def counted_input(job, key, values):
+    """ Pass values on to a combiner or reducer while counting them."""
+    protocol = job.internal_protocol()
+    for value in values:
+        count_input(job, 1, len(protocol.write(key, value)) + 1)
+        yield value
+
+
+def task_output(job, output, protocol=None):
+    """ Yield output records of a task while counting them."""
+    if protocol is None:
+        protocol = job.internal_protocol()
+    for key, value in output:
+        job.task_output_records += 1
+        job.task_output_bytes += len(protocol.write(key, value)) + 1
+        yield (key, value)
+
+
+def task_done(job, output=(), protocol=None):
+    """ Yield the last output of a task, then record the task's input,
+        output and wall time under the counters of its stage."""
+    # Only imported here, the Spark jobs use this module without mrjob
+    from mrjob.compat import jobconf_from_env
+    for record in task_output(job, output, protocol):
+        yield record
+    end = time.time()
+    stage = job.task_stage
+    task = int(jobconf_from_env('mapreduce.task.partition', 0))
+    job.increment_counter(stage, 'tasks', 1)
+    job.increment_counter(stage, 'input records', job.task_records)
+    job.increment_counter(stage, 'input bytes', job.task_bytes)
+    job.increment_counter(stage, 'output records', job.task_output_records)
+    job.increment_counter(stage, 'output bytes', job.task_output_bytes)
+    job.increment_counter(stage, 'time us', int((end - job.task_time) * 1e6))
+    job.increment_counter(stage, 'task %d time us' % task, int((end - job.task_time) * 1e6))
+    job.increment_counter(stage, 'task %d start ms' % task, int(job.task_time * 1e3))
+    job.increment_counter(stage, 'task %d end ms' % task, int(end * 1e3))
+
+
+class TaskSteps(object):
+    """ Start and end of the combiner and reducer tasks, shared by the steps
+        below. Mappers start and end the task in their own _init and _final."""
+
+    def combiner_init(self):
+        task_start(self, 'combiner')
+
+    def combiner_final(self):
+        return task_done(self)
+
+    def reducer_init(self):
+        task_start(self, 'reducer')
+
+    def reducer_final(self):
+        return task_done(self)
+
+    def task_step(self, **kwargs):
+        """ MRStep with the task start and end of every stage it has."""
+        # Only imported here, the Spark jobs use this module without mrjob
+        from mrjob.step import MRStep
+        if 'combiner' in kwargs:
+            kwargs.update(combiner_init=self.combiner_init, combiner_final=self.combiner_final)
+        if 'reducer' in kwargs:
+            kwargs.update(reducer_init=self.reducer_init, reducer_final=self.reducer_final)
+        return MRStep(**kwargs)
+
+
+def step_report(counters):
+    """ Report of one step from its counters. The per task counters are
+        turned into the wall time of the step, from the first task starting
+        to the last one ending, and the task times of every stage."""
+    report = {"counters": {}, "task times": {}}
+    starts = []
+    ends = []
+    for stage, group in counters.items():
+        times = {}
+        report["counters"][stage] = {}
+        for name, value in group.items():
+            match = TASK_COUNTER.match(name)
+            if match is None:
+                report["counters"][stage][name] = value
+            elif match.group(2) == 'time us':
+                times[int(match.group(1))] = value / 1e6
+            elif match.group(2) == 'start ms':
+                starts.append(value)
+            else:
+                ends.append(value)
+        if times:
+            task_times = list(times.values())
+            report["task times"][stage] = {"tasks": len(task_times),
+                                           "min": min(task_times),
+                                           "mean": sum(task_times) / len(task_times),
+                                           "max": max(task_times),
+                                           "per task": times}
+    if starts:
+        report["wall time"] = (max(ends) - min(starts)) / 1e3
+    return report
+
+
+# Jobs run several times in one process, but logging handlers must only be added once
+_logging_set_up = False
+
+
+def run_job(job_class, args, reports=None):
+    """ Run job_class with the given command line arguments and
+        return its output as a list of (key, value) pairs.
+        The wall time of the run and the wall time, task times and
+        counters of every step are appended to reports."""
+    global _logging_set_up
+    job = job_class(args)
+    if not _logging_set_up:
+        job.set_up_logging(quiet=job.options.quiet, verbose=job.options.verbose)
+        _logging_set_up = True
+    with job.make_runner() as runner:
+        start = time.time()
+        runner.run()
+        wall_time = time.time() - start
+        output = list(job.parse_output(runner.cat_output()))
+
+        if reports is not None:
+            # Runners only time the whole run, the time of every step comes
+            # from the start and end counters of its tasks
+            steps = [step_report(counters) for counters in runner.counters()]
+            reports.append({"args": args, "wall time": wall_time, "steps": steps})
+        return output
+
+
+def mean_args(output):
+    """ Arguments passing the mean from the output of a first run on
+        to the second run, or None if there were no values at all."""
+    mean = dict(output).get("Mean: ")
+    if mean is None:
+        return None
+    return ['--mean', repr(mean)]
+
+
+def has_mean(options):
+    return options.mean is not None or getattr(options, 'group_means', None) is not None
+
+
+def run_with_mean(job_class, args, mean_args=mean_args):
+    """ The mean deviation needs the mean before the values can be summed,
+        which no fixed size summary can provide in a single pass.
+        Run the job once to get the mean and then again with --mean, which
+        only runs the MeanDeviationSteps of the job."""
+    job = job_class(args)
+    if job.is_task() or has_mean(job.options):
+        job.execute()
+        return
+
+    reports = []
+    output = run_job(job_class, args, reports)
+    second_args = mean_args(output)
+    if second_args is not None:
+        second = run_job(job_class, args + second_args, reports)
+        # Results of the second run replace those of the first one
+        repeated = set(json_key(key) for key, value in second)
+        output = [(k, v) for k, v in output if json_key(k) not in repeated] + second
+    protocol = job.output_protocol()
+    for key, value in output:
+        sys.stdout.buffer.write(protocol.write(key, value) + b"\n")
+    sys.stdout.flush()
+
+    if job.options.report is not None:
+        with open(job.options.report, 'w') as f:
+            json.dump({"job": job_class.__name__, "runs": reports}, f, indent=2)
+
+
+class SummarySteps(TaskSteps):
+    """ Methods of the step summarizing the values. Values are summarized in
+        the mapper and mapper_final emits a single record, so the shuffle
+        does not grow with the number of lines. Every record has a bounded
+        size no matter how many values it summarizes, so memory use in the
+        combiners and reducers does not grow with the input either.
+        Jobs override summary_group to summarize a single group."""
+
+    def summary_group(self):
+        # Only values of this group are summarized, None summarizes all of them
+        return None
+
+    def mapper_init(self):
+        self.group_choice = self.summary_group()
+        self.summary = new_summary(self.options)
+        task_start(self, 'mapper')
+
+    def mapper(self, _, line):
+        if self.options.input_format != 'text':
+            ids, groups, values = read_block_ref(self, line)
+            if self.group_choice is not None:
+                values = values[groups == self.group_choice]
+            merge_summaries(self.summary, summary_from_array(values, self.options))
+            return
+        count_input(self, 1, len(line.encode()) + 1)
+        splitline = line.split()
+        if self.group_choice is None or int(splitline[1]) == self.group_choice:
+            summary_add(self.summary, float(splitline[2]), self.options)
+
+    def mapper_final(self):
+        output = []
+        if self.summary[0][0] > 0:
+            output.append(("stats", self.summary))
+        return task_done(self, output)
+
+    def merge_stats(self, key, counts):
+        summary = new_summary(self.options)
+        for c in counted_input(self, key, counts):
+            merge_summaries(summary, c)
+        return summary
+
+    def combiner(self, key, counts):
+        summary = self.merge_stats(key, counts)
+        return task_output(self, [(key, summary)])
+
+    def reducer(self, key, counts):
+        summary = self.merge_stats(key, counts)
+        return task_output(self, summary_output(summary, self.options), self.output_protocol())
+
+    def summary_step(self):
+        return self.task_step(mapper_init=self.mapper_init,
+                              mapper=self.mapper,
+                              mapper_final=self.mapper_final,
+                              combiner=self.combiner,
+                              reducer=self.reducer)
+
+
+class MeanDeviationSteps(TaskSteps):
+    """ Methods of the step run once the mean is known. The mappers only
+        count the values and sum |x - mean|, everything else was computed
+        by the first run. Jobs override deviation_mean to skip values or
+        to sum per group."""
+
+    # Whether deviation_mean depends on the group, otherwise blocks are
+    # summed as a whole without splitting them by group first
+    grouped_deviations = False
+
+    def deviation_mean(self, group):
+        """ Output key and mean for the values of group, None skips them."""
+        return ("Mean deviation: ", self.options.mean)
+
+    def mean_dev_mapper_init(self):
+        self.deviations = {}
+        task_start(self, 'mapper')
+
+    def add_deviations(self, key, count, total):
+        old_count, old_total = self.deviations.get(key, (0, 0.0))
+        self.deviations[key] = (old_count + count, old_total + total)
+
+    def mean_dev_mapper(self, _, line):
+        # Only sum locally, mean_dev_mapper_final emits one record per key
+        if self.options.input_format != 'text':
+            ids, groups, values = read_block_ref(self, line)
+            if not self.grouped_deviations:
+                key, mean = self.deviation_mean(None)
+                self.add_deviations(key, len(values), float(np.abs(values - mean).sum()))
+                return
+            for group in np.unique(groups).tolist():
+                selected = self.deviation_mean(group)
+                if selected is not None:
+                    key, mean = selected
+                    group_values = values[groups == group]
+                    self.add_deviations(key, len(group_values), float(np.abs(group_values - mean).sum()))
+            return
+        count_input(self, 1, len(line.encode()) + 1)
+        splitline = line.split()
+        selected = self.deviation_mean(int(splitline[1]) if self.grouped_deviations else None)
+        if selected is not None:
+            key, mean = selected
+            self.add_deviations(key, 1, abs(float(splitline[2]) - mean))
+
+    def mean_dev_mapper_final(self):
+        return task_done(self, self.deviations.items())
+
+    def merge_dev_stats(self, key, counts):
+        total_lines = 0
+        total_sum_mean = 0.0
+        for c in counted_input(self, key, counts):
+            total_lines += c[0]
+            total_sum_mean += c[1]
+        return (total_lines, total_sum_mean)
+
+    def mean_dev_combiner(self, key, counts):
+        dev_stats = self.merge_dev_stats(key, counts)
+        return task_output(self, [(key, dev_stats)])
+
+    def mean_dev_reducer(self, key, counts):
+        total_lines, total_sum_mean = self.merge_dev_stats(key, counts)
+        mean_dev = float(total_sum_mean) / total_lines
+        return task_output(self, [(key, mean_dev)], self.output_protocol())
+
+    def mean_dev_step(self):
+        return self.task_step(mapper_init=self.mean_dev_mapper_init,
+                              mapper=self.mean_dev_mapper,
+                              mapper_final=self.mean_dev_mapper_final,
+                              combiner=self.mean_dev_combiner,
+                              reducer=self.mean_dev_reducer)
+
+
+def json_key(key):
+    # Keys read back from the job output may be lists, which are not hashable
+    return tuple(key) if isinstance(key, list) else key
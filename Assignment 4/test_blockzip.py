@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import unittest
+import blockzip
+
+# Run with: python -m pytest test_blockzip.py, or python test_blockzip.py
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TESTDATA = os.path.join(HERE, 'testdata.dat')
+
+
+def codecs():
+    try:
+        blockzip._zstandard()
+    except ImportError:
+        return ['gzip']
+    return blockzip.CODECS
+
+
+class ConvertTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='test_blockzip')
+        with open(TESTDATA, 'rb') as f:
+            self.lines = f.read().splitlines()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_convert(self, codec, block_rows, workers):
+        path = os.path.join(self.directory, 'blocks.' + codec)
+        nr_rows, nr_blocks = blockzip.convert(TESTDATA, path, codec, 1, block_rows, workers)
+        _, index = blockzip.read_index(path)
+        lines = b''.join(blockzip.read_block(path, block) for block in range(len(index))).splitlines()
+        self.assertEqual(nr_rows, len(self.lines))
+        self.assertEqual(nr_blocks, len(index))
+        self.assertEqual(int(index['rows'].sum()), len(self.lines))
+        self.assertEqual(lines, self.lines)
+
+    def test_convert_keeps_every_row(self):
+        # Includes more blocks than one batch of 4 * workers
+        for codec in codecs():
+            for block_rows, workers in [(100, 2), (100, 3), (50, 1), (7, 2), (5000, 1)]:
+                with self.subTest(codec=codec, block_rows=block_rows, workers=workers):
+                    self.check_convert(codec, block_rows, workers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Times the RDD job (problem1a.py) against the DataFrame job (problem1a_df.py)
+# for a number of --cores values. Every run is a separate process with its
+# own Spark context, so the times include starting Spark.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+JOBS = [
+    ("rdd", ["problem1a.py"]),
+    ("df", ["problem1a_df.py"]),
+    ("df pandas", ["problem1a_df.py", "--parser", "pandas"]),
+]
+
+
+def run_time(job, path, cores):
+    command = [sys.executable, os.path.join(HERE, job[0])] + job[1:] + ["--file", path, "--cores", str(cores)]
+    start = time.time()
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    return time.time() - start, output
+
+
+def benchmark(args):
+    cores = [int(c) for c in args.cores.split(',')]
+    print("Job\t\t" + "\t".join("%d cores [s]" % c for c in cores))
+    reference = None
+    for name, job in JOBS:
+        times = []
+        for c in cores:
+            results = [run_time(job, args.file, c) for i in range(args.repeat)]
+            times.append(min(t for t, output in results))
+            output = results[0][1]
+            if reference is None:
+                reference = output
+            elif output != reference:
+                sys.stderr.write("Output of %s with %d cores differs from rdd\n" % (name, c))
+        print("%-9s\t" % name + "\t".join("%1.3f\t" % t for t in times))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compare the RDD and DataFrame Spark jobs',
+        epilog = 'Example: benchmark_spark.py --file data.dat --cores 1,2,4,8'
+    )
+    parser.add_argument('--file', '-f',
+                        required=True,
+                        type = str,
+                        help='File to process')
+    parser.add_argument('--cores', '-c',
+                        default='1,2,4',
+                        type = str,
+                        help='Comma separated numbers of cores to run with')
+    parser.add_argument('--repeat',
+                        default=3,
+                        type = int,
+                        help='Number of runs, the fastest one is reported')
+    args = parser.parse_args()
+    benchmark(args)
@@ -1,50 +1,205 @@
-from pyspark import SparkContext
+from pyspark import SparkContext, StorageLevel
 import argparse
 import math
+import os
+import sys
+import numpy as np
+
+# The columnar reader and the sampling code live with the MRJob jobs
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Assignment 4'))
+import columnar
+import blockzip
+import statsutil
+import local_engine
+import approx
+
+
+def columnarValues(sc, path):
+    # One partition per block, each task decodes its block straight into a NumPy array
+    nr_blocks = columnar.read_header(path)[1]
+    sc.addPyFile(columnar.__file__)
+    return sc.parallelize(range(nr_blocks), nr_blocks).map(
+        lambda block: columnar.read_block(path, block)[2])
+
+def blockzipValues(sc, path):
+    # One partition per compressed block, so the blocks are decompressed in parallel
+    nr_blocks = len(blockzip.read_index(path)[1])
+    sc.addPyFile(blockzip.__file__)
+    sc.addPyFile(columnar.__file__)
+    return sc.parallelize(range(nr_blocks), nr_blocks).map(
+        lambda block: columnar.parse_text(blockzip.read_block(path, block))[2])
+
+def textValues(lines):
+    # All values of a partition of the text file in one array
+    yield np.array([float(l.split()[2]) for l in lines], dtype=np.float64)
+
+def partitionArray(blocks):
+    # The values of one partition, its elements are arrays of values
+    blocks = list(blocks)
+    return np.concatenate(blocks) if blocks else np.zeros(0)
+
+def approximateStats(sc, args):
+    # Every round reads the sampled blocks in parallel, one task per block
+    for module in (columnar, blockzip, statsutil, local_engine, approx):
+        sc.addPyFile(module.__file__)
+    readBlocks = lambda blocks, center: sc.parallelize(blocks, len(blocks)).map(
+        lambda block: approx.block_summary(block, args, center)).collect()
+    for label, value in approx.run_sampling(os.path.abspath(args.file), args, readBlocks):
+        if isinstance(value, list) and isinstance(value[1], float):
+            print("%-20s%1.6f +- %1.6f" % (label, value[0], value[1]))
+        else:
+            print("%-20s%s" % (label, value))
+
+def partitionMoments(blocks):
+    # [count, mean, M2, minimum, maximum] of one partition, merged with statsutil.merge_moments
+    yield statsutil.moments_from_array(partitionArray(blocks))
+
+def partitionDeviations(blocks, mean, minimum, maximum):
+    # Sum of absolute deviations and the histogram counts of one partition
+    x = partitionArray(blocks)
+    yield (float(np.abs(x - mean).sum()), statsutil.histogram_from_array(x, minimum, maximum, 10))
+
+def addDeviations(a, b):
+    return (a[0] + b[0], statsutil.merge_histograms(a[1], b[1]))
+
+def partitionBuckets(blocks, lo, hi, nr_bins):
+    # Count, minimum and maximum per bucket of the values in [lo, hi], the last bucket is closed
+    x = partitionArray(blocks)
+    x = x[(x >= lo) & (x <= hi)]
+    edges = np.linspace(lo, hi, nr_bins + 1)
+    index = np.clip(np.searchsorted(edges, x, 'right') - 1, 0, nr_bins - 1)
+    mins = np.full(nr_bins, np.inf)
+    maxs = np.full(nr_bins, -np.inf)
+    np.minimum.at(mins, index, x)
+    np.maximum.at(maxs, index, x)
+    yield (np.bincount(index, minlength=nr_bins), mins, maxs)
+
+def mergeBuckets(a, b):
+    return (a[0] + b[0], np.minimum(a[1], b[1]), np.maximum(a[2], b[2]))
+
+def selectRank(values, rank, count, minimum, maximum, nr_bins, max_collect):
+    """ Value at position rank of the sorted values without sorting them.
+        Every pass counts the values per bucket of the remaining range and
+        keeps the bucket holding the rank, narrowed to its smallest and
+        largest value, until it is small enough to collect and select from."""
+    lo, hi = minimum, maximum
+    while lo < hi and count > max_collect:
+        counts, mins, maxs = values.mapPartitions(
+            lambda part: partitionBuckets(part, lo, hi, nr_bins)).treeReduce(mergeBuckets)
+        cumulative = np.cumsum(counts)
+        bucket = int(np.searchsorted(cumulative, rank, 'right'))
+        rank -= cumulative[bucket - 1] if bucket else 0
+        count = counts[bucket]
+        lo, hi = mins[bucket], maxs[bucket]
+    if lo == hi:
+        return float(lo)
+    # Buckets do not overlap, so [lo, hi] holds exactly the values of the chosen bucket.
+    # Only these are taken out of their arrays and collected.
+    remaining = np.array(values.flatMap(lambda x: x[(x >= lo) & (x <= hi)].tolist()).collect())
+    return float(np.partition(remaining, rank)[rank])
+
+def medianBins(text):
+    # With a single bucket every pass would keep the whole range and never finish
+    nr_bins = int(text)
+    if nr_bins < 2:
+        raise argparse.ArgumentTypeError("at least 2 buckets are needed, got %d" % nr_bins)
+    return nr_bins
+
+def partitionSketch(blocks, k):
+    sketch = statsutil.new_sketch(k)
+    for value in partitionArray(blocks).tolist():
+        statsutil.sketch_add(sketch, value)
+    yield sketch
+
+def reportJobs(sc, group):
+    # Number of Spark jobs and stages started for this run
+    tracker = sc.statusTracker()
+    jobs = tracker.getJobIdsForGroup(group)
+    stages = 0
+    for job in jobs:
+        info = tracker.getJobInfo(job)
+        if info is not None:
+            stages += len(info.stageIds)
+    sys.stderr.write("Ran %d Spark jobs with %d stages\n" % (len(jobs), stages))
+
+def formatStats(maximum, minimum, mean_dev, std_dev, buckets, bucketcounts, median):
+    return [
+        "Maximum : %1.6f" % maximum,
+        "Minimum : %1.6f" % minimum,
+        "Mean deviation: %1.6f" % mean_dev,
+        "Standard deviation: %1.6f" % std_dev,
+        "Buckets",
+        "Bucket 1 = %1.6f <= X < %1.6f : %d" % (buckets[0], buckets[1], bucketcounts[0]),
+        "Bucket 2 = %1.6f <= X < %1.6f : %d" % (buckets[1], buckets[2], bucketcounts[1]),
+        "Bucket 3 = %1.6f <= X < %1.6f : %d" % (buckets[2], buckets[3], bucketcounts[2]),
+        "Bucket 4 = %1.6f <= X < %1.6f : %d" % (buckets[3], buckets[4], bucketcounts[3]),
+        "Bucket 5 = %1.6f <= X < %1.6f : %d" % (buckets[4], buckets[5], bucketcounts[4]),
+        "Bucket 6 = %1.6f <= X < %1.6f : %d" % (buckets[5], buckets[6], bucketcounts[5]),
+        "Bucket 7 = %1.6f <= X < %1.6f : %d" % (buckets[6], buckets[7], bucketcounts[6]),
+        "Bucket 8 = %1.6f <= X < %1.6f : %d" % (buckets[7], buckets[8], bucketcounts[7]),
+        "Bucket 9 = %1.6f <= X < %1.6f : %d" % (buckets[8], buckets[9], bucketcounts[8]),
+        "Bucket 10 = %1.6f <= X <= %1.6f : %d" % (buckets[9], buckets[10], bucketcounts[9]),
+        "Median : %1.6f" % median,
+    ]
+
+def printStats(*stats):
+    print("\n".join(formatStats(*stats)))
+
+def readValues(sc, args):
+    # An RDD of NumPy arrays of values, one or a few per partition
+    if args.format == 'columnar':
+        return columnarValues(sc, os.path.abspath(args.file))
+    if args.format == 'blockzip':
+        return blockzipValues(sc, os.path.abspath(args.file))
+    return sc.textFile(args.file).mapPartitions(textValues)
+
+def computeStats(values, args):
+    """ Statistics of an RDD of arrays of values from readValues, which
+        should be persisted since it is read several times. Returns the
+        arguments of printStats."""
+    # Pass one: count, mean, M2, minimum and maximum in a single action
+    lines, mean, m2, minimum, maximum = values.mapPartitions(partitionMoments).treeAggregate(
+        [0, 0.0, 0.0, float('inf'), float('-inf')], statsutil.merge_moments, statsutil.merge_moments)
+    std_dev = math.sqrt(m2 / lines)
+    # Pass two: mean deviation and the histogram, which need the mean and the range.
+    # Ten even buckets from minimum to maximum with the last one closed, like RDD.histogram(10)
+    buckets = np.linspace(minimum, maximum, 11)
+    mean_dev, hist = values.mapPartitions(
+        lambda part: partitionDeviations(part, mean, minimum, maximum)).treeReduce(addDeviations)
+    mean_dev = mean_dev / lines
+    bucketcounts = statsutil.closed_histogram(hist)
+    # Calculate median, exactly by narrowing down on it or from merged quantile sketches
+    if args.median == 'exact':
+        median = selectRank(values, int(lines/2), lines, minimum, maximum, args.median_bins, args.max_collect)
+    else:
+        median = statsutil.sketch_quantiles(values.mapPartitions(
+            lambda part: partitionSketch(part, args.sketch_k)).treeReduce(statsutil.merge_sketches), [0.5])[0]
+    return maximum, minimum, mean_dev, std_dev, buckets, bucketcounts, median
 
 def produceStats(args):
     # Initialize Spark
     sc = SparkContext("local[%d]" % args.cores)
-    data = sc.textFile(args.file)
-
-    # Gather all values
-    values = data.map(lambda l: l.split()).map(lambda l: float(l[2]))
-    # Count the elements
-    lines = values.count()
-    # Calculate min and max
-    maximum = values.reduce(lambda a, b: max(a, b))
-    minimum = values.reduce(lambda a, b: min(a, b))
-    # Create a histogram
-    buckets, bucketcounts = values.histogram(10)
-    # Calculate mean to use for mean and standard deviation
-    mean = values.reduce(lambda a, b: a + b) / lines
-    # Calculate mean and standard deviation
-    std_dev = math.sqrt(values.map(lambda l: (l - mean)**2).reduce(lambda a, b: a + b) / lines)
-    mean_dev = values.map(lambda l: abs(l - mean)).reduce(lambda a, b: a + b) / lines
-    # Calculate median
-    median = values.sortBy(lambda l: l).collect()[int(lines/2)]
-
-
-    # Print results
-    print("Maximum : %1.6f" % maximum)
-    print("Minimum : %1.6f" % minimum)
-    print("Mean deviation: %1.6f" % mean_dev)
-    print("Standard deviation: %1.6f" % std_dev)
-    print("Buckets")
-    print("Bucket 1 = %1.6f <= X < %1.6f : %d" % (buckets[0], buckets[1], bucketcounts[0]))
-    print("Bucket 2 = %1.6f <= X < %1.6f : %d" % (buckets[1], buckets[2], bucketcounts[1]))
-    print("Bucket 3 = %1.6f <= X < %1.6f : %d" % (buckets[2], buckets[3], bucketcounts[2]))
-    print("Bucket 4 = %1.6f <= X < %1.6f : %d" % (buckets[3], buckets[4], bucketcounts[3]))
-    print("Bucket 5 = %1.6f <= X < %1.6f : %d" % (buckets[4], buckets[5], bucketcounts[4]))
-    print("Bucket 6 = %1.6f <= X < %1.6f : %d" % (buckets[5], buckets[6], bucketcounts[5]))
-    print("Bucket 7 = %1.6f <= X < %1.6f : %d" % (buckets[6], buckets[7], bucketcounts[6]))
-    print("Bucket 8 = %1.6f <= X < %1.6f : %d" % (buckets[7], buckets[8], bucketcounts[7]))
-    print("Bucket 9 = %1.6f <= X < %1.6f : %d" % (buckets[8], buckets[9], bucketcounts[8]))
-    print("Bucket 10 = %1.6f <= X <= %1.6f : %d" % (buckets[9], buckets[10], bucketcounts[9]))
-    print("Median : %1.6f" % median)
+    sc.setJobGroup("problem1a", "Statistics of %s" % args.file)
+
+    if args.approximate:
+        approximateStats(sc, args)
+        reportJobs(sc, "problem1a")
+        return
+
+    # Gather all values, parsed once and kept in memory for the passes
+    values = readValues(sc, args)
+    values.persist(StorageLevel.MEMORY_ONLY)
+    # statsutil imports the block readers
+    for module in (columnar, blockzip, statsutil):
+        sc.addPyFile(module.__file__)
+    stats = computeStats(values, args)
+    values.unpersist()
+
+    printStats(*stats)
+    reportJobs(sc, "problem1a")
 
             
-if __name__ == '__main__':
+def makeParser():
     parser = argparse.ArgumentParser(
         description='Produce stats from data with Spark',
         epilog = 'Example: problem1a.py --file data.dat'
@@ -56,5 +211,30 @@ if __name__ == '__main__':
                         type = int,
                         default = 1,
                         help='Number of cores')
-    args = parser.parse_args()
+    parser.add_argument('--format',
+                        choices = ['text', 'columnar', 'blockzip'],
+                        default = 'text',
+                        help='Input format, columnar and block compressed files are written by '
+                             '"columnar.py convert" and "blockzip.py convert"')
+    parser.add_argument('--approximate',
+                        action='store_true',
+                        help='Estimate the statistics with confidence bounds from a sample of blocks')
+    parser.add_argument('--median',
+                        choices = ['exact', 'approximate'],
+                        default = 'exact',
+                        help='Select the exact median or estimate it with a quantile sketch of --sketch-k items')
+    parser.add_argument('--median-bins',
+                        type = medianBins,
+                        default = 1000,
+                        help='Buckets counted per pass while narrowing down on the exact median')
+    parser.add_argument('--max-collect',
+                        type = int,
+                        default = 100000,
+                        help='Most values brought to the driver to select the exact median from')
+    statsutil.add_summary_args(parser.add_argument)
+    approx.add_approximate_args(parser.add_argument)
+    return parser
+
+if __name__ == '__main__':
+    args = makeParser().parse_args()
     produceStats(args)
\ No newline at end of file
@@ -0,0 +1,136 @@
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+from pyspark.sql.functions import pandas_udf
+from pyspark.sql.types import StructType, StructField, LongType, IntegerType, DoubleType
+import argparse
+import numpy as np
+import pandas as pd
+from problem1a import printStats, medianBins
+
+# DataFrame version of problem1a.py. Parsing and all aggregates run as
+# built-in functions inside the JVM, so rows never pass through the Python
+# workers. The only Python left is the optional --parser pandas, which parses
+# whole Arrow batches of lines with pandas instead of one row at a time.
+
+SCHEMA = StructType([
+    StructField("id", LongType(), False),
+    StructField("group", IntegerType(), False),
+    StructField("value", DoubleType(), False),
+])
+
+
+@pandas_udf(DoubleType())
+def parseValue(lines: pd.Series) -> pd.Series:
+    return lines.str.split(n=2, expand=True)[2].astype(np.float64)
+
+
+def readData(spark, args):
+    lines = spark.read.text(args.file)
+    if args.parser == 'pandas':
+        return lines.select(parseValue("value").alias("value"))
+    # Lines are "%d %-7d %f", split on runs of spaces and cast to the schema
+    fields = F.split(F.trim(F.col("value")), r"\s+")
+    return lines.select([fields[i].cast(field.dataType).alias(field.name)
+                         for i, field in enumerate(SCHEMA.fields)])
+
+
+def selectRank(df, rank, count, minimum, maximum, nr_bins, max_collect):
+    """ Value at position rank of the sorted values, narrowing down on it
+        with bucket counts like selectRank in problem1a.py. Every pass is one
+        aggregation over at most nr_bins groups, so no single task has to
+        hold all the values the way the percentile aggregate does."""
+    value = F.col("value")
+    lo, hi = minimum, maximum
+    while lo < hi and count > max_collect:
+        bucket = F.least(F.floor((value - lo) / (hi - lo) * nr_bins), F.lit(nr_bins - 1))
+        rows = sorted(df.where(value.between(lo, hi))
+                        .groupBy(bucket.alias("bucket"))
+                        .agg(F.count(value).alias("count"), F.min(value).alias("min"), F.max(value).alias("max"))
+                        .collect())
+        # Keep the bucket holding the rank, narrowed to its smallest and largest value
+        for row in rows:
+            if rank < row["count"]:
+                break
+            rank -= row["count"]
+        count, lo, hi = row["count"], row["min"], row["max"]
+    if lo == hi:
+        return float(lo)
+    remaining = np.array([row[0] for row in df.where(value.between(lo, hi)).collect()])
+    return float(np.partition(remaining, rank)[rank])
+
+
+def produceStats(args):
+    # Initialize Spark, Arrow moves the batches to and from the pandas UDF
+    spark = (SparkSession.builder
+             .master("local[%d]" % args.cores)
+             .appName("problem1a_df")
+             .config("spark.sql.execution.arrow.pyspark.enabled", "true")
+             .getOrCreate())
+
+    df = readData(spark, args).select("value").cache()
+    value = F.col("value")
+
+    # Pass one: count, range and moments in a single aggregation
+    first = df.agg(F.count(value).alias("lines"),
+                   F.min(value).alias("minimum"),
+                   F.max(value).alias("maximum"),
+                   F.mean(value).alias("mean"),
+                   F.stddev_pop(value).alias("std_dev")).first()
+    lines, minimum, maximum, mean = first["lines"], first["minimum"], first["maximum"], first["mean"]
+
+    # Pass two: mean deviation and ten even buckets from minimum to maximum, the last one closed.
+    # Same bucketing as statsutil.histogram_from_array and closed_histogram
+    width = (maximum - minimum) / 10.0
+    bucket = F.lit(9) if width == 0 else F.least(F.floor((value - minimum) / (maximum - minimum) * 10),
+                                                 F.lit(9))
+    second = df.agg(F.mean(F.abs(value - mean)).alias("mean_dev"),
+                    *[F.sum(F.when(bucket == i, 1).otherwise(0)).alias("bucket%d" % i)
+                      for i in range(10)]).first()
+    buckets = [minimum + i * width for i in range(10)] + [maximum]
+    bucketcounts = [second["bucket%d" % i] for i in range(10)]
+
+    # Calculate median, the element at position lines/2 of the sorted values like problem1a.py
+    if args.median == 'exact':
+        median = selectRank(df, int(lines / 2), lines, minimum, maximum, args.median_bins, args.max_collect)
+    else:
+        median = df.agg(F.percentile_approx(value, 0.5, args.accuracy)).first()[0]
+    df.unpersist()
+
+    printStats(maximum, minimum, second["mean_dev"], first["std_dev"], buckets, bucketcounts, median)
+    spark.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Produce stats from data with Spark DataFrames',
+        epilog = 'Example: problem1a_df.py --file data.dat --cores 4'
+    )
+    parser.add_argument('--file', '-f',
+                        type = str,
+                        help='File to process')
+    parser.add_argument('--cores', '-c',
+                        type = int,
+                        default = 1,
+                        help='Number of cores')
+    parser.add_argument('--parser',
+                        choices = ['jvm', 'pandas'],
+                        default = 'jvm',
+                        help='Parse lines with built-in functions or with a vectorized pandas UDF')
+    parser.add_argument('--median',
+                        choices = ['exact', 'approximate'],
+                        default = 'exact',
+                        help='Exact median or percentile_approx')
+    parser.add_argument('--median-bins',
+                        type = medianBins,
+                        default = 1000,
+                        help='Buckets counted per pass while narrowing down on the exact median')
+    parser.add_argument('--max-collect',
+                        type = int,
+                        default = 100000,
+                        help='Most values brought to the driver to select the exact median from')
+    parser.add_argument('--accuracy',
+                        type = int,
+                        default = 10000,
+                        help='Accuracy of percentile_approx, the rank error is about 1/accuracy')
+    args = parser.parse_args()
+    produceStats(args)
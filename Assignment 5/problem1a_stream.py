@@ -0,0 +1,133 @@
+from pyspark.sql import SparkSession
+import argparse
+import json
+import os
+import sys
+import time
+
+# The summaries are shared with the MRJob jobs
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Assignment 4'))
+import columnar
+import blockzip
+import statsutil
+
+# Streaming version of problem1a.py. Spark watches a directory and every
+# trigger reads the files that arrived since the last one. The micro-batch
+# is summarized on the executors (moments, histogram and quantile sketch,
+# see statsutil), merged into the running summary on the driver and the
+# updated statistics are printed.
+#
+# Spark's checkpoint remembers which files were read. The running summary
+# is saved next to it together with the id of the last batch merged, so a
+# restarted query neither loses nor counts a batch twice: Spark replays the
+# batch that was running when it stopped and that batch is skipped if it
+# was already merged.
+
+STATE_FILE = "stats_state.json"
+
+
+def partitionSummary(rows, options):
+    ids, groups, values = columnar.parse_text(" ".join(row.value for row in rows if row.value.strip()))
+    yield statsutil.summary_from_array(values, options)
+
+
+class RunningStats(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.path = os.path.join(args.checkpoint, STATE_FILE)
+        self.batch = -1
+        self.summary = statsutil.new_summary(args)
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                state = json.load(f)
+            self.batch, self.summary = state["batch"], state["summary"]
+
+    def save(self):
+        # Write to a temporary file first so an interrupted save keeps the old state
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({"batch": self.batch, "summary": self.summary}, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def update(self, batch, batch_id):
+        if batch_id <= self.batch:
+            sys.stderr.write("Batch %d already merged, skipping it\n" % batch_id)
+            return
+        start = time.time()
+        args = self.args
+        summary = batch.rdd.mapPartitions(lambda rows: partitionSummary(rows, args)).treeAggregate(
+            statsutil.new_summary(args), statsutil.merge_summaries, statsutil.merge_summaries)
+        new_lines = summary[0][0]
+        self.summary = statsutil.merge_summaries(self.summary, summary)
+        self.batch = batch_id
+        self.save()
+
+        # The mean keeps changing, so the mean deviation is estimated from the sketch
+        moments = self.summary[0]
+        if moments[0]:
+            print("Batch %d" % batch_id)
+            for label, value in statsutil.summary_output(self.summary, args, sketch_mean_dev=True):
+                print("%-20s%s" % (label, value))
+            sys.stdout.flush()
+        sys.stderr.write("Batch %d: %d new lines, %d in total, updated in %1.3f s\n"
+                         % (batch_id, new_lines, moments[0], time.time() - start))
+
+
+def streamStats(args):
+    spark = (SparkSession.builder
+             .master("local[%d]" % args.cores)
+             .appName("problem1a_stream")
+             .getOrCreate())
+    sc = spark.sparkContext
+    for module in (columnar, blockzip, statsutil):
+        sc.addPyFile(module.__file__)
+
+    if not os.path.exists(args.checkpoint):
+        os.makedirs(args.checkpoint)
+    stats = RunningStats(args)
+    lines = (spark.readStream
+             .option("maxFilesPerTrigger", args.max_files)
+             .text(args.directory))
+    query = (lines.writeStream
+             .foreachBatch(stats.update)
+             .option("checkpointLocation", os.path.join(args.checkpoint, "query"))
+             .trigger(processingTime="%g seconds" % args.trigger)
+             .start())
+    query.awaitTermination(args.timeout)
+    query.stop()
+    spark.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Produce running stats from data files arriving in a directory',
+        epilog = 'Example: problem1a_stream.py --directory incoming --checkpoint stream-state'
+    )
+    parser.add_argument('--directory', '-d',
+                        required = True,
+                        type = str,
+                        help='Directory to watch for new data files')
+    parser.add_argument('--checkpoint',
+                        required = True,
+                        type = str,
+                        help='Directory for the Spark checkpoint and the running statistics')
+    parser.add_argument('--cores', '-c',
+                        type = int,
+                        default = 1,
+                        help='Number of cores')
+    parser.add_argument('--trigger', '-t',
+                        type = float,
+                        default = 1.0,
+                        help='Seconds between micro-batches')
+    parser.add_argument('--max-files',
+                        type = int,
+                        default = 100,
+                        help='Most new files read per micro-batch')
+    parser.add_argument('--timeout',
+                        type = float,
+                        default = None,
+                        help='Stop after this many seconds, runs until interrupted by default')
+    statsutil.add_summary_args(parser.add_argument)
+    args = parser.parse_args()
+    args.mean = None
+    streamStats(args)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+import argparse
+import json
+import os
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Client of stats_service.py. Sends one request per file, all at the same
+# time on their own connections, and prints the reports in the order the
+# files were given. Options not listed here are passed on as problem1a.py
+# options, for example --median approximate.
+
+
+def request(args, path, options):
+    with socket.create_connection((args.host, args.port)) as connection:
+        # The service may run in another directory
+        message = {"args": ["--file", os.path.abspath(path)] + options, "pool": args.pool}
+        connection.sendall(json.dumps(message).encode() + b"\n")
+        with connection.makefile('rb') as reply:
+            return json.loads(reply.readline())
+
+
+def run(args, options):
+    failed = False
+    with ThreadPoolExecutor(max_workers=len(args.files)) as executor:
+        replies = list(executor.map(lambda path: request(args, path, options), args.files))
+    for path, reply in zip(args.files, replies):
+        if len(args.files) > 1:
+            print("== %s" % path)
+        if not reply["ok"]:
+            sys.stderr.write("%s: %s\n" % (path, reply["error"]))
+            failed = True
+            continue
+        print("\n".join(reply["lines"]))
+        sys.stderr.write("%s: %1.3f s%s\n" % (path, reply["seconds"], " (cached input)" if reply["cached"] else ""))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Get stats for data files from stats_service.py',
+        epilog = 'Example: stats_client.py data1.dat data2.dat --median approximate'
+    )
+    parser.add_argument('files',
+                        nargs='+',
+                        help='Files to process')
+    parser.add_argument('--host',
+                        type = str,
+                        default = 'localhost',
+                        help='Address of the service')
+    parser.add_argument('--port', '-p',
+                        type = int,
+                        default = 5151,
+                        help='Port of the service')
+    parser.add_argument('--pool',
+                        type = str,
+                        default = 'default',
+                        help='Fair scheduler pool to run the requests in')
+    args, options = parser.parse_known_args()
+    sys.exit(run(args, options))
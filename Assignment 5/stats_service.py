@@ -0,0 +1,148 @@
+from pyspark import SparkConf, SparkContext, StorageLevel
+import argparse
+import collections
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+import problem1a
+
+# Long running version of problem1a.py. One Spark context is started once
+# and kept warm, and stats_client.py sends it requests over a local socket,
+# so a request only pays for the statistics and not for starting Spark.
+#
+# Every connection is served by its own thread and its jobs run in the fair
+# scheduler pool the request names, so a large file does not hold up the
+# requests behind it. Parsed inputs stay persisted in an LRU cache keyed by
+# file, format, size and modification time; a changed file is parsed again.
+#
+# Protocol: one JSON object per line in each direction. A request holds
+# "args", the command line arguments of problem1a.py, and optionally
+# "pool". The reply has "ok", the report "lines" or an "error", the time
+# taken in "seconds" and "cached" telling if the parsed input was reused.
+
+
+class InputCache(object):
+
+    def __init__(self, sc, size):
+        self.sc = sc
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, args):
+        """ Persisted values of the input of args and whether they were cached."""
+        path = os.path.abspath(args.file)
+        stat = os.stat(path)
+        key = (path, args.format, stat.st_size, stat.st_mtime)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key], True
+            # Older versions of the same file will not be asked for again
+            for old in [old for old in self.entries if old[:2] == key[:2]]:
+                self.entries.pop(old).unpersist()
+            values = problem1a.readValues(self.sc, args).persist(StorageLevel.MEMORY_ONLY)
+            self.entries[key] = values
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)[1].unpersist()
+            return values, False
+
+
+class StatsHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            reply = self.server.service.run(json.loads(line))
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+            self.wfile.flush()
+
+
+class StatsServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StatsService(object):
+
+    def __init__(self, args):
+        conf = (SparkConf()
+                .setMaster("local[%d]" % args.cores)
+                .setAppName("stats_service")
+                .set("spark.scheduler.mode", "FAIR"))
+        if args.pools:
+            conf.set("spark.scheduler.allocation.file", os.path.abspath(args.pools))
+        self.sc = SparkContext(conf=conf)
+        for module in (problem1a.columnar, problem1a.blockzip, problem1a.statsutil):
+            self.sc.addPyFile(module.__file__)
+        self.cache = InputCache(self.sc, args.cache_files)
+        self.parser = problem1a.makeParser()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def run(self, request):
+        start = time.time()
+        with self.lock:
+            self.requests += 1
+            group = "request-%d" % self.requests
+        try:
+            args = self.parser.parse_args(request["args"])
+        except SystemExit:
+            return {"ok": False, "error": "Invalid arguments %r" % (request["args"],)}
+        if args.file is None or args.approximate:
+            return {"ok": False, "error": "Requests need --file and can not use --approximate"}
+
+        # Local properties belong to the calling thread, so every request gets its own
+        self.sc.setLocalProperty("spark.scheduler.pool", request.get("pool", "default"))
+        self.sc.setJobGroup(group, "Statistics of %s" % args.file)
+        try:
+            values, cached = self.cache.get(args)
+            lines = problem1a.formatStats(*problem1a.computeStats(values, args))
+        except Exception as e:
+            return {"ok": False, "error": "%s: %s" % (type(e).__name__, e)}
+        finally:
+            self.sc.setLocalProperty("spark.scheduler.pool", None)
+        seconds = time.time() - start
+        sys.stderr.write("%s on %s in %1.3f s%s\n"
+                         % (group, args.file, seconds, " (cached input)" if cached else ""))
+        return {"ok": True, "lines": lines, "seconds": seconds, "cached": cached}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Keep a Spark context running and serve stats requests from stats_client.py',
+        epilog = 'Example: stats_service.py --cores 8 --port 5151'
+    )
+    parser.add_argument('--cores', '-c',
+                        type = int,
+                        default = 1,
+                        help='Number of cores')
+    parser.add_argument('--host',
+                        type = str,
+                        default = 'localhost',
+                        help='Address to listen on')
+    parser.add_argument('--port', '-p',
+                        type = int,
+                        default = 5151,
+                        help='Port to listen on')
+    parser.add_argument('--cache-files',
+                        type = int,
+                        default = 8,
+                        help='Number of parsed inputs kept in memory')
+    parser.add_argument('--pools',
+                        type = str,
+                        help='Fair scheduler allocation file defining the pools')
+    args = parser.parse_args()
+    server = StatsServer((args.host, args.port), StatsHandler)
+    server.service = StatsService(args)
+    sys.stderr.write("Serving stats requests on %s:%d\n" % (args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    server.service.sc.stop()